@@ -73,6 +73,17 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'GuestManagementSystem.wsgi.application'
+
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'GuestManagementSystemtApp.authentication.UserTokenAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ],
+    # Opt-in: lists only paginate when ?page= / ?page_size= / ?cursor= is sent
+    'DEFAULT_PAGINATION_CLASS': 'GuestManagementSystemtApp.pagination.OptionalPageNumberPagination',
+    'PAGE_SIZE': 50,
+}
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",
@@ -91,6 +102,32 @@ DATABASES = {
 }
 
 
+# Cache
+# Per-process by default; point this at Redis/Memcached when running several workers
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'guest-management',
+    }
+}
+
+# Seconds the dashboard statistics may be served from cache
+DASHBOARD_STATS_TTL = 30
+
+# Seconds a catalog entry lives; product/category writes invalidate sooner
+CATALOG_CACHE_TTL = 60 * 60
+
+# Upper bound on in-memory autocomplete keys per kind (product/room/customer)
+AUTOCOMPLETE_MAX_KEYS = 50000
+
+# UserToken lifetime (advertised to clients as expires_in) and the per-process
+# lookup cache in front of the shared one
+AUTH_TOKEN_TTL = 60 * 60 * 24
+AUTH_TOKEN_LOCAL_CACHE_SIZE = 1024
+AUTH_TOKEN_LOCAL_TTL = 30
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -130,6 +167,10 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Internal location (e.g. '/protected-media/') under which nginx serves MEDIA_ROOT;
+# when set, media responses hand the transfer to the proxy via X-Accel-Redirect
+MEDIA_ACCEL_REDIRECT_PREFIX = None
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
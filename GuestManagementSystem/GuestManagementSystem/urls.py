@@ -1,7 +1,11 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
+
+from GuestManagementSystemtApp.media import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('GuestManagementSystemtApp.urls')),
+    # MEDIA_URL, as used in serialized image URLs; the frontend uses api/media/
+    re_path(r'^media/(?P<path>.+)$', serve_media),
 ]
\ No newline at end of file
@@ -0,0 +1,253 @@
+"""
+Revenue and occupancy analytics.
+
+Order revenue is aggregated in the database (one GROUP BY per breakdown).
+Room metrics need each stay's night overlap with the requested window, so the
+overlapping reservations are read once as columns and reduced with NumPy.
+Windows that end before the rollup horizon are read from the daily rollup
+tables (see rollups.py) instead. Reports are cached per (metric, bucket,
+window); windows that ended before today change rarely and are kept longer.
+"""
+from datetime import datetime
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import DailyOccupancy, DailySales, Order, OrderItem, Room, RoomReservation
+from .rollups import rollup_horizon, rollup_start, window_bounds
+
+BUCKETS = {
+    'day': TruncDate,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+CURRENT_WINDOW_TTL = 60
+PAST_WINDOW_TTL = 60 * 60
+
+
+def _cached(key, end, compute):
+    ttl = PAST_WINDOW_TTL if end <= timezone.localdate() else CURRENT_WINDOW_TTL
+    return cache.get_or_set(key, compute, ttl)
+
+
+def _covered_by_rollups(start, end):
+    horizon = rollup_horizon()
+    if horizon is None or end > horizon:
+        return False
+    first = rollup_start()
+    return first is not None and first <= start
+
+
+def _money(value):
+    return f'{value or 0:.2f}'
+
+
+def _period(value):
+    return (value.date() if isinstance(value, datetime) else value).isoformat()
+
+
+def _occupancy_metrics(available, sold, revenue):
+    return {
+        'available_nights': int(available),
+        'sold_nights': int(sold),
+        'occupancy': round(float(sold / available), 4) if available else 0.0,
+        'room_revenue': _money(revenue),
+        'adr': _money(revenue / sold if sold else 0),
+        'revpar': _money(revenue / available if available else 0),
+    }
+
+
+def revenue_report(start, end, bucket='day'):
+    """Order revenue for [start, end) per ``bucket`` and per product category"""
+
+    def compute():
+        if _covered_by_rollups(start, end):
+            return _revenue_from_rollups(start, end, bucket)
+
+        lo, hi = window_bounds(start, end)
+        items = (
+            OrderItem.objects
+            .filter(order__created_at__gte=lo, order__created_at__lt=hi)
+            .exclude(order__status__in=Order.NON_REVENUE_STATUSES)
+        )
+        line_total = ExpressionWrapper(
+            F('quantity') * F('price'), output_field=DecimalField(max_digits=14, decimal_places=2)
+        )
+
+        periods = (
+            items
+            .annotate(period=BUCKETS[bucket]('order__created_at'))
+            .values('period')
+            .annotate(revenue=Sum(line_total), orders=Count('order', distinct=True), items=Sum('quantity'))
+            .order_by('period')
+        )
+        # Products in several categories count towards each of them
+        categories = (
+            items
+            .values('product__categories__id', 'product__categories__name')
+            .annotate(revenue=Sum(line_total), items=Sum('quantity'))
+            .order_by('-revenue')
+        )
+        totals = items.aggregate(revenue=Sum(line_total), orders=Count('order', distinct=True))
+
+        return {
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'bucket': bucket,
+            'total_revenue': _money(totals['revenue']),
+            'total_orders': totals['orders'],
+            'periods': [
+                {
+                    'period': _period(row['period']),
+                    'revenue': _money(row['revenue']),
+                    'orders': row['orders'],
+                    'items': row['items'],
+                }
+                for row in periods
+            ],
+            'categories': [
+                {
+                    'category_id': row['product__categories__id'],
+                    'category': row['product__categories__name'] or 'Uncategorized',
+                    'revenue': _money(row['revenue']),
+                    'items': row['items'],
+                }
+                for row in categories
+            ],
+        }
+
+    return _cached(f'analytics:revenue:{bucket}:{start}:{end}', end, compute)
+
+
+def _revenue_from_rollups(start, end, bucket):
+    rows = DailySales.objects.filter(date__gte=start, date__lt=end)
+    totals = rows.filter(is_total=True)
+    # Rollup rows are already one per day
+    period = F('date') if bucket == 'day' else BUCKETS[bucket]('date')
+
+    periods = (
+        totals
+        .annotate(period=period)
+        .values('period')
+        .annotate(revenue=Sum('revenue'), orders=Sum('orders'), items=Sum('items'))
+        .order_by('period')
+    )
+    categories = (
+        rows.filter(is_total=False)
+        .values('category_id', 'category__name')
+        .annotate(revenue=Sum('revenue'), items=Sum('items'))
+        .order_by('-revenue')
+    )
+    overall = totals.aggregate(revenue=Sum('revenue'), orders=Sum('orders'))
+
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'bucket': bucket,
+        'total_revenue': _money(overall['revenue']),
+        'total_orders': overall['orders'] or 0,
+        'periods': [
+            {
+                'period': _period(row['period']),
+                'revenue': _money(row['revenue']),
+                'orders': row['orders'],
+                'items': row['items'],
+            }
+            for row in periods
+        ],
+        'categories': [
+            {
+                'category_id': row['category_id'],
+                'category': row['category__name'] or 'Uncategorized',
+                'revenue': _money(row['revenue']),
+                'items': row['items'],
+            }
+            for row in categories
+        ],
+    }
+
+
+def occupancy_report(start, end):
+    """Occupancy, ADR and RevPAR per room category for the nights in [start, end)"""
+
+    def compute():
+        if _covered_by_rollups(start, end):
+            return _occupancy_from_rollups(start, end)
+
+        codes = [code for code, _ in Room.CATEGORY_CHOICES]
+        index = {code: i for i, code in enumerate(codes)}
+        nights = (end - start).days
+
+        room_counts = np.zeros(len(codes))
+        for row in Room.objects.filter(is_active=True).values('categories').annotate(n=Count('id')):
+            room_counts[index[row['categories']]] = row['n']
+
+        stays = list(
+            RoomReservation.objects
+            .filter(status__in=RoomReservation.SOLD_STATUSES, check_in__lt=end, check_out__gt=start)
+            .values_list('room__categories', 'check_in', 'check_out', 'total_amount')
+        )
+        sold = np.zeros(len(codes))
+        revenue = np.zeros(len(codes))
+        if stays:
+            category, check_in, check_out, amount = zip(*stays)
+            category = np.array([index[c] for c in category])
+            check_in = np.array([d.toordinal() for d in check_in])
+            check_out = np.array([d.toordinal() for d in check_out])
+            amount = np.array(amount, dtype=float)
+
+            overlap = np.clip(
+                np.minimum(check_out, end.toordinal()) - np.maximum(check_in, start.toordinal()), 0, None
+            )
+            # Spread each stay's total evenly over its nights, keep the ones inside the window
+            stay_revenue = amount * overlap / np.maximum(check_out - check_in, 1)
+            sold = np.bincount(category, weights=overlap, minlength=len(codes))
+            revenue = np.bincount(category, weights=stay_revenue, minlength=len(codes))
+
+        return _occupancy_payload(start, end, room_counts, room_counts * nights, sold, revenue)
+
+    return _cached(f'analytics:occupancy:{start}:{end}', end, compute)
+
+
+def _occupancy_from_rollups(start, end):
+    codes = [code for code, _ in Room.CATEGORY_CHOICES]
+    index = {code: i for i, code in enumerate(codes)}
+    nights = (end - start).days
+
+    available = np.zeros(len(codes))
+    sold = np.zeros(len(codes))
+    revenue = np.zeros(len(codes))
+    rows = (
+        DailyOccupancy.objects
+        .filter(date__gte=start, date__lt=end)
+        .values('room_category')
+        .annotate(available=Sum('rooms'), sold=Sum('sold_nights'), revenue=Sum('revenue'))
+    )
+    for row in rows:
+        i = index[row['room_category']]
+        available[i], sold[i], revenue[i] = row['available'], row['sold'], row['revenue']
+
+    # Room counts can change over the window; report the average
+    room_counts = np.round(available / nights) if nights else available
+    return _occupancy_payload(start, end, room_counts, available, sold, revenue)
+
+
+def _occupancy_payload(start, end, room_counts, available, sold, revenue):
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'overall': _occupancy_metrics(available.sum(), sold.sum(), revenue.sum()),
+        'categories': [
+            {
+                'category': code,
+                'category_display': label,
+                'rooms': int(room_counts[i]),
+                **_occupancy_metrics(available[i], sold[i], revenue[i]),
+            }
+            for i, (code, label) in enumerate(Room.CATEGORY_CHOICES)
+        ],
+    }
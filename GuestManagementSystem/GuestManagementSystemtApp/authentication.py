@@ -0,0 +1,224 @@
+"""
+UserToken authentication.
+
+Tokens live ``AUTH_TOKEN_TTL`` seconds from creation. A lookup goes through an
+in-process LRU first, then the shared Django cache, and only reaches the
+database on a miss in both; the cached entry carries the token's expiry so an
+expired token is rejected without a query. Logout, token deletion and edits to
+the owning User/Customer drop the entry from both layers. Other workers' LRUs
+are not told about that, which is why local entries only live
+``AUTH_TOKEN_LOCAL_TTL`` seconds before falling back to the shared cache.
+
+Login goes through ``resolve_login``: one query over both account tables and
+exactly one password hash per attempt, including for unknown emails.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.cache import cache
+from django.db.models import BooleanField, Case, IntegerField, Q, Value, When
+from django.utils import timezone
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+
+from .models import Customer, User, UserToken
+
+
+def token_expires_at(token):
+    return token.created + timedelta(seconds=settings.AUTH_TOKEN_TTL)
+
+
+def _cache_key(key):
+    return f'auth:token:{key}'
+
+
+class LocalTokenCache:
+    """Small thread-safe LRU of key -> (principal, expires_at timestamp)"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_tokens = LocalTokenCache(settings.AUTH_TOKEN_LOCAL_CACHE_SIZE, settings.AUTH_TOKEN_LOCAL_TTL)
+
+
+def _load_token(key):
+    """(principal, expires_at timestamp) from the database, or None"""
+    token = UserToken.objects.select_related('user', 'customer').filter(key=key).first()
+    if token is None:
+        return None
+    principal = token.user or token.customer
+    if principal is None:
+        return None
+    return principal, token_expires_at(token).timestamp()
+
+
+def resolve_token(key):
+    """Principal for ``key`` (cache first), or None if unknown or expired"""
+    entry = local_tokens.get(key)
+    if entry is None:
+        entry = cache.get(_cache_key(key))
+        if entry is None:
+            entry = _load_token(key)
+            if entry is None:
+                return None
+            remaining = int(entry[1] - time.time())
+            if remaining > 0:
+                cache.set(_cache_key(key), entry, remaining)
+        local_tokens.set(key, entry)
+
+    principal, expires_at = entry
+    if expires_at <= time.time():
+        invalidate_token(key)
+        return None
+    # Each request gets its own instance so views can't leak changes into the cache
+    return copy.copy(principal)
+
+
+def invalidate_token(key):
+    local_tokens.pop(key)
+    cache.delete(_cache_key(key))
+
+
+def invalidate_principal_tokens(**principal):
+    """Drop cached tokens of a User (user=...) or Customer (customer=...)"""
+    for key in UserToken.objects.filter(**principal).values_list('key', flat=True):
+        invalidate_token(key)
+
+
+def issue_token(**principal):
+    """Current token of a User/Customer, replacing it once it has expired"""
+    token = UserToken.objects.filter(**principal).first()
+    if token is not None and token_expires_at(token) <= timezone.now():
+        token.delete()
+        token = None
+    if token is None:
+        token = UserToken.objects.create(**principal)
+    return token
+
+
+def revoke_token(key):
+    UserToken.objects.filter(key=key).delete()
+    invalidate_token(key)
+
+
+@lru_cache(maxsize=None)
+def _dummy_password_hash():
+    return make_password('not-a-real-password')
+
+
+def _login_candidates(email):
+    """(is_staff, pk, password, is_active) per account with ``email``, staff first, in one query"""
+    staff = (
+        User.objects.filter(email=email)
+        .annotate(
+            staff=Value(True, output_field=BooleanField()),
+            active=Case(When(status='INACTIVE', then=Value(False)), default=Value(True)),
+            rank=Value(0, output_field=IntegerField()),
+        )
+        .values_list('staff', 'pk', 'password', 'active', 'rank')
+    )
+    customers = (
+        Customer.objects.filter(email=email)
+        .annotate(
+            staff=Value(False, output_field=BooleanField()),
+            active=Q(is_active=True),
+            rank=Value(1, output_field=IntegerField()),
+        )
+        .values_list('staff', 'pk', 'password', 'active', 'rank')
+    )
+    return [row[:4] for row in staff.union(customers, all=True).order_by('rank')]
+
+
+def resolve_login(email, password):
+    """Staff User or Customer for these credentials, or None
+
+    Exactly one hash per attempt: unknown emails are checked against a dummy
+    hash, and an email present in both tables is checked against the staff
+    account only. A hash made with an outdated hasher is upgraded in place.
+    The matching row is then loaded by primary key; the UNION can't return
+    two model types, and that second query only runs after a successful hash.
+    """
+    candidates = _login_candidates(email)
+    if not candidates:
+        check_password(password, _dummy_password_hash())
+        return None
+
+    is_staff, pk, encoded, active = candidates[0]
+    model = User if is_staff else Customer
+
+    def upgrade(raw_password):
+        model.objects.filter(pk=pk).update(password=make_password(raw_password))
+
+    if check_password(password, encoded, setter=upgrade) and active:
+        return model.objects.get(pk=pk)
+    return None
+
+
+def is_active_principal(principal):
+    """Same rules as the login serializers"""
+    if isinstance(principal, User):
+        return principal.status != 'INACTIVE'
+    return principal.is_active
+
+
+class UserTokenAuthentication(BaseAuthentication):
+    """``Authorization: Token <key>`` against UserToken (staff User or Customer)"""
+    keyword = 'Token'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise AuthenticationFailed('Invalid token header.')
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            raise AuthenticationFailed('Invalid token header.')
+
+        principal = resolve_token(key)
+        if principal is None:
+            raise AuthenticationFailed('Invalid or expired token.')
+        if not is_active_principal(principal):
+            raise AuthenticationFailed('User inactive or deleted.')
+        return principal, key
+
+    def authenticate_header(self, request):
+        return self.keyword
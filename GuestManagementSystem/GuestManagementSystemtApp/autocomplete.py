@@ -0,0 +1,164 @@
+"""
+Type-ahead over product names, room codes and customer names.
+
+Each kind keeps a sorted list of (key, id) pairs in process memory, with one
+key per word of the label (so "Coffee cake" is found by "cak" too); a lookup
+is one bisect plus a short forward scan. Saves and deletes update the list on
+commit. A shared version counter per kind makes other processes rebuild on
+their next lookup. Each kind holds at most ``AUTOCOMPLETE_MAX_KEYS`` keys,
+newest rows first, so memory stays bounded however large the tables grow.
+"""
+import threading
+from bisect import bisect_left, insort
+
+from django.conf import settings
+
+from .models import Customer, Product, Room
+from .search import tokenize
+from .versioning import bump_version, get_version
+
+
+# Longest key stored; longer words are cut
+MAX_KEY_LENGTH = 40
+
+# Candidates read per result wanted when earlier words still have to be checked
+CANDIDATE_FACTOR = 20
+
+
+def _product_rows(ids=None):
+    queryset = Product.objects.filter(is_active=True)
+    if ids is not None:
+        queryset = queryset.filter(id__in=ids)
+    return ((pk, name, [name]) for pk, name in queryset.order_by('-id').values_list('id', 'name').iterator())
+
+
+def _room_rows(ids=None):
+    queryset = Room.objects.all()
+    if ids is not None:
+        queryset = queryset.filter(id__in=ids)
+    return ((pk, code, [code]) for pk, code in queryset.order_by('-id').values_list('id', 'room_code').iterator())
+
+
+def _customer_rows(ids=None):
+    queryset = Customer.objects.filter(is_active=True)
+    if ids is not None:
+        queryset = queryset.filter(id__in=ids)
+    rows = queryset.order_by('-id').values_list('id', 'first_name', 'last_name', 'username').iterator()
+    for pk, first_name, last_name, username in rows:
+        full_name = f'{first_name} {last_name}'.strip()
+        yield pk, full_name or username, [full_name, username]
+
+
+class PrefixIndex:
+    def __init__(self, kind, load_rows):
+        self.kind = kind
+        self.load_rows = load_rows
+        self.version = None
+        self._lock = threading.RLock()
+        self._keys = []
+        self._labels = {}
+        self._entity_keys = {}
+
+    @property
+    def version_key(self):
+        return f'autocomplete:{self.kind}:version'
+
+    @staticmethod
+    def _keys_for(texts):
+        return sorted({term[:MAX_KEY_LENGTH] for text in texts for term in tokenize(text)})
+
+    def rebuild(self, version=None):
+        version = get_version(self.version_key) if version is None else version
+        keys, labels, entity_keys = [], {}, {}
+        for pk, label, texts in self.load_rows():
+            own = self._keys_for(texts)
+            if len(keys) + len(own) > settings.AUTOCOMPLETE_MAX_KEYS:
+                break
+            keys.extend((key, pk) for key in own)
+            labels[pk] = (label, own)
+            entity_keys[pk] = own
+        keys.sort()
+        with self._lock:
+            self._keys, self._labels, self._entity_keys = keys, labels, entity_keys
+            self.version = version
+
+    def ensure_current(self):
+        version = get_version(self.version_key)
+        if version != self.version:
+            self.rebuild(version)
+
+    def _remove(self, pk):
+        for key in self._entity_keys.pop(pk, ()):
+            index = bisect_left(self._keys, (key, pk))
+            if index < len(self._keys) and self._keys[index] == (key, pk):
+                del self._keys[index]
+        self._labels.pop(pk, None)
+
+    def refresh(self, ids):
+        """Re-read ``ids`` after a committed write in this process"""
+        rows = {pk: (label, texts) for pk, label, texts in self.load_rows(ids)}
+        with self._lock:
+            version = bump_version(self.version_key)
+            if self.version is None or version != self.version + 1:
+                # Another process wrote too; rebuild on the next lookup
+                return
+            for pk in ids:
+                self._remove(pk)
+                if pk not in rows:
+                    continue
+                label, texts = rows[pk]
+                own = self._keys_for(texts)
+                if len(self._keys) + len(own) > settings.AUTOCOMPLETE_MAX_KEYS:
+                    continue
+                for key in own:
+                    insort(self._keys, (key, pk))
+                self._labels[pk] = (label, own)
+                self._entity_keys[pk] = own
+            self.version = version
+
+    def invalidate(self):
+        """Make every process rebuild before its next lookup"""
+        bump_version(self.version_key)
+
+    def lookup(self, prefix, limit):
+        """Up to ``limit`` id -> (label, words) entries with a word starting with ``prefix``"""
+        prefix = prefix[:MAX_KEY_LENGTH]
+        results = {}
+        with self._lock:
+            index = bisect_left(self._keys, (prefix,))
+            while index < len(self._keys) and len(results) < limit:
+                key, pk = self._keys[index]
+                if not key.startswith(prefix):
+                    break
+                results.setdefault(pk, self._labels[pk])
+                index += 1
+        return results
+
+
+indexes = {
+    'product': PrefixIndex('product', _product_rows),
+    'room': PrefixIndex('room', _room_rows),
+    'customer': PrefixIndex('customer', _customer_rows),
+}
+
+
+def autocomplete(query, kinds, limit=10):
+    """[{kind, id, label}], up to ``limit`` per kind, whose words start with every word of ``query``"""
+    words = tokenize(query)
+    if not words:
+        return []
+    # The last word is still being typed; it drives the bisect, earlier words filter
+    *complete, partial = words
+    results = []
+    for kind in kinds:
+        index = indexes[kind]
+        index.ensure_current()
+        candidates = index.lookup(partial, limit * CANDIDATE_FACTOR if complete else limit)
+        matched = 0
+        for pk, (label, label_words) in candidates.items():
+            if all(any(w.startswith(word) for w in label_words) for word in complete):
+                results.append({'kind': kind, 'id': pk, 'label': label})
+                matched += 1
+                if matched >= limit:
+                    break
+    return results
@@ -0,0 +1,55 @@
+"""
+Room availability queries.
+
+A room is free for [check_in, check_out) when it has no reservation in one of
+RoomReservation.ACTIVE_STATUSES whose own range overlaps it. Everything here is
+expressed as a correlated NOT EXISTS so each question is answered in a single
+query backed by the (room, status, check_in, check_out) index.
+"""
+from django.db.models import Exists, OuterRef
+
+from .models import RoomReservation
+
+
+def overlapping_reservations(check_in, check_out):
+    """Active reservations whose stay intersects [check_in, check_out)"""
+    return RoomReservation.objects.filter(
+        status__in=RoomReservation.ACTIVE_STATUSES,
+        check_in__lt=check_out,
+        check_out__gt=check_in,
+    )
+
+
+def is_room_available(room, check_in, check_out, exclude=None):
+    """True if ``room`` has no active reservation overlapping the range"""
+    clashes = overlapping_reservations(check_in, check_out).filter(room=room)
+    if exclude is not None:
+        clashes = clashes.exclude(pk=exclude.pk)
+    return not clashes.exists()
+
+
+def annotate_availability(rooms, check_in, check_out):
+    """Add an ``available`` boolean to every room in one query"""
+    clashes = overlapping_reservations(check_in, check_out).filter(room=OuterRef('pk'))
+    return rooms.annotate(available=~Exists(clashes))
+
+
+def availability_calendar(rooms, start, end):
+    """
+    Per-night free/occupied matrix for ``rooms`` over [start, end).
+    Reads the overlapping reservations once and marks their nights as
+    occupied by slicing, so the cost is independent of rooms x days queries.
+    Returns ``{room_id: [bool, ...]}`` with True meaning free that night.
+    """
+    days = (end - start).days
+    free = {room.id: [True] * days for room in rooms}
+    stays = (
+        overlapping_reservations(start, end)
+        .filter(room_id__in=list(free))
+        .values_list('room_id', 'check_in', 'check_out')
+    )
+    for room_id, check_in, check_out in stays:
+        lo = max((check_in - start).days, 0)
+        hi = min((check_out - start).days, days)
+        free[room_id][lo:hi] = [False] * (hi - lo)
+    return free
@@ -0,0 +1,60 @@
+"""
+Product catalog cache.
+
+Serialized product lists (per category filter), product details and search
+results are cached under a catalog version number. Any write to a product or
+category bumps the version once the transaction commits, which orphans every
+cached entry at once; they then age out on their TTL. Each entry carries an
+ETag computed when it was built, so a client revalidating with If-None-Match
+gets a 304 from a cache read without any serialization.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from .versioning import bump_version, get_version
+
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+
+def catalog_version():
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    bump_version(CATALOG_VERSION_KEY)
+
+
+def invalidate_catalog():
+    """Bump the version after the current transaction commits (right away outside one)"""
+    transaction.on_commit(bump_catalog_version)
+
+
+def _etag(data):
+    body = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True).encode()
+    return '"%s"' % hashlib.md5(body).hexdigest()
+
+
+def catalog_response(request, name, build):
+    """Response for the catalog entry ``name``, calling ``build()`` for the data on a miss"""
+    # Image fields are absolute URLs, so entries are per host; hashed to keep keys memcached-safe
+    scope = hashlib.md5(f'{request.get_host()}:{name}'.encode()).hexdigest()
+    key = f'catalog:{catalog_version()}:{scope}'
+    entry = cache.get(key)
+    if entry is None:
+        data = build()
+        entry = (_etag(data), data)
+        cache.set(key, entry, settings.CATALOG_CACHE_TTL)
+
+    etag, data = entry
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+    return Response(data, headers={'ETag': etag})
@@ -0,0 +1,105 @@
+"""
+Product image variants.
+
+Uploads are stored untouched; the ``process_product_images`` command later
+renders each size in ``VARIANT_SIZES`` as WebP and JPEG next to the original
+(products/PRD123.jpg -> products/variants/PRD123_thumb.3f2a9c01b7de.webp, ...)
+and records the file names in ``Product.image_variants``. Names carry a hash
+of the file's bytes, so a given URL never changes content and media.py can
+serve it as immutable. Replacing an image clears that field (see signals),
+which queues the product again.
+"""
+import hashlib
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .catalog import invalidate_catalog
+from .models import Product
+
+
+# Bounding boxes; images are scaled down to fit, never up
+VARIANT_SIZES = {
+    'thumb': (320, 320),
+    'medium': (1024, 1024),
+}
+
+FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+
+
+def variant_name(image_name, size, fmt, content):
+    directory, filename = os.path.split(image_name)
+    stem = os.path.splitext(filename)[0]
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    return os.path.join(directory, 'variants', f'{stem}_{size}.{digest}.{fmt}')
+
+
+def render_variants(image_name):
+    """Write every size/format of ``image_name``; returns {size: {fmt: name}}"""
+    with default_storage.open(image_name, 'rb') as source:
+        original = ImageOps.exif_transpose(Image.open(source))
+        original.load()
+
+    variants = {}
+    for size, box in VARIANT_SIZES.items():
+        resized = original.copy()
+        resized.thumbnail(box, Image.LANCZOS)
+        variants[size] = {}
+        for fmt, options in FORMATS.items():
+            image = resized
+            if options['format'] == 'JPEG' and image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            elif image.mode not in ('RGB', 'RGBA', 'L'):
+                image = image.convert('RGBA')
+            buffer = BytesIO()
+            image.save(buffer, **options)
+
+            content = buffer.getvalue()
+            name = variant_name(image_name, size, fmt, content)
+            # Same name means same bytes, so an existing file is reused as is
+            if not default_storage.exists(name):
+                name = default_storage.save(name, ContentFile(content))
+            variants[size][fmt] = name
+    return variants
+
+
+def delete_variants(variants):
+    for formats in variants.values():
+        if isinstance(formats, dict):
+            for name in formats.values():
+                default_storage.delete(name)
+
+
+def pending_products():
+    return (
+        Product.objects
+        .exclude(Q(image='') | Q(image__isnull=True))
+        .filter(image_variants={})
+        .order_by('id')
+    )
+
+
+def process_batch(batch_size=20):
+    """Render variants for up to ``batch_size`` pending products; returns (done, failed)"""
+    done = failed = 0
+    for product_id, image_name in pending_products().values_list('id', 'image')[:batch_size]:
+        try:
+            variants = render_variants(image_name)
+        except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as exc:
+            # Recorded so a broken upload isn't retried forever
+            variants = {'error': str(exc)}
+            failed += 1
+        else:
+            done += 1
+        # Only if the image wasn't replaced meanwhile
+        Product.objects.filter(id=product_id, image=image_name).update(image_variants=variants)
+    if done or failed:
+        invalidate_catalog()
+    return done, failed
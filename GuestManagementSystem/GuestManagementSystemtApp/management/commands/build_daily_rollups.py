@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from GuestManagementSystemtApp.rollups import build_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the daily sales/occupancy rollups for every day touched since the last run. "
+        "Schedule it hourly or nightly (e.g. cron: 15 * * * * manage.py build_daily_rollups)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild every day instead of only changed ones')
+
+    def handle(self, *args, **options):
+        days = build_rollups(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rollups for {len(days)} day(s)'))
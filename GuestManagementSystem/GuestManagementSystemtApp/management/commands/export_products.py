@@ -0,0 +1,23 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from GuestManagementSystemtApp.product_io import FORMATS, export_products, format_for
+
+
+class Command(BaseCommand):
+    help = "Write every product as CSV or JSONL, in the format import_products reads back."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help='Output file, or - for stdout (default)')
+        parser.add_argument('--format', choices=list(FORMATS), help='Defaults to the file extension, else csv')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or (None if path == '-' else format_for(path)) or 'csv'
+        if path == '-':
+            sys.stdout.writelines(export_products(file_format))
+            return
+        with open(path, 'w', encoding='utf-8', newline='') as output:
+            output.writelines(export_products(file_format))
+        self.stderr.write(self.style.SUCCESS(f'Exported products to {path}'))
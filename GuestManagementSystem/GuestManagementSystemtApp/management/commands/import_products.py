@@ -0,0 +1,45 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from GuestManagementSystemtApp.product_io import (
+    CHUNK_SIZE, FORMATS, ImportFileError, format_for, import_products, read_rows,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Create or update products from a CSV or JSONL file, matched by product_code. "
+        "Nothing is written if any row is invalid."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or - for stdin")
+        parser.add_argument('--format', choices=list(FORMATS), help='Defaults to the file extension, else csv')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows validated and written per batch')
+        parser.add_argument('--dry-run', action='store_true', help='Validate and count without writing')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or (None if path == '-' else format_for(path)) or 'csv'
+        try:
+            source = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        except OSError as exc:
+            raise CommandError(exc)
+
+        with source:
+            try:
+                result = import_products(
+                    read_rows(source, file_format), dry_run=options['dry_run'], chunk_size=options['chunk_size'],
+                )
+            except ImportFileError as exc:
+                raise CommandError(exc)
+
+        for error in result['errors']:
+            self.stderr.write(f"line {error['line']}: {error['errors']}")
+        if result['errors']:
+            raise CommandError(f"{len(result['errors'])} invalid row(s) shown, nothing imported")
+        verb = 'Would import' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {result['created']} new and {result['updated']} updated product(s)"
+        ))
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from GuestManagementSystemtApp.images import delete_variants, pending_products, process_batch
+from GuestManagementSystemtApp.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Render thumbnail/medium WebP and JPEG variants for product images that don't have them yet. "
+        "Run it from cron every minute, or keep it running with --loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=20, help='Products processed per batch')
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting when done')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between polls with --loop')
+        parser.add_argument('--all', action='store_true', help='Re-render variants for every product image first')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            # Variant names are content hashes, so old files aren't overwritten; drop them first
+            rendered = Product.objects.exclude(image_variants={})
+            for variants in rendered.values_list('image_variants', flat=True).iterator():
+                delete_variants(variants)
+            rendered.update(image_variants={})
+
+        while True:
+            done = failed = 0
+            while pending_products().exists():
+                batch_done, batch_failed = process_batch(options['batch_size'])
+                if not batch_done and not batch_failed:
+                    break
+                done += batch_done
+                failed += batch_failed
+            if done or failed or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f'Processed {done} image(s), {failed} failed'))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
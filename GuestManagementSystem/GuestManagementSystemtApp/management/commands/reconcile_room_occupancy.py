@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from GuestManagementSystemtApp.occupancy import reconcile_all
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute Room.reserved for every room from tonight's reservations in one UPDATE. "
+        "Schedule it just after midnight (e.g. cron: 5 0 * * * manage.py reconcile_room_occupancy)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Reconcile as of this date (YYYY-MM-DD) instead of today')
+
+    def handle(self, *args, **options):
+        today = None
+        if options['date']:
+            today = parse_date(options['date'])
+            if today is None:
+                raise CommandError('--date must be YYYY-MM-DD')
+        changed = reconcile_all(today)
+        self.stdout.write(self.style.SUCCESS(f'Updated reserved flag on {changed} room(s)'))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from GuestManagementSystemtApp.outbox import drain_outbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Send due EmailOutbox rows in batches over one SMTP connection per batch. "
+        "Run it from cron every minute, or keep it running with --loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Emails sent per SMTP connection')
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting when drained')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = drain_outbox(options['batch_size'])
+            if sent or failed or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f'Sent {sent} email(s), {failed} failed'))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,157 @@
+"""
+Media file serving.
+
+Replaces django.views.static.serve for MEDIA_ROOT. Every response carries a
+strong ETag and Last-Modified so clients revalidate with a 304. Files whose
+name embeds a content hash (image variants, see images.py) never change and
+are marked immutable for a year; other uploads get a short max-age.
+Whole files go out through FileResponse, which hands the open file to the
+server's wsgi.file_wrapper (sendfile where available); single byte ranges
+are answered with 206. With MEDIA_ACCEL_REDIRECT_PREFIX set, the transfer
+itself is left to the front-end proxy via X-Accel-Redirect.
+"""
+import hashlib
+import mimetypes
+import os
+import re
+import stat
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse,
+)
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags
+from django.views.decorators.http import require_safe
+
+
+# name.<12 hex digits>.ext, as written by images.variant_name
+HASHED_NAME_RE = re.compile(r'\.([0-9a-f]{12})\.[A-Za-z0-9]+$')
+
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+MUTABLE_MAX_AGE = 60 * 60
+
+CHUNK_SIZE = 64 * 1024
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+@lru_cache(maxsize=4096)
+def _content_hash(path, mtime_ns, size):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:32]
+
+
+def file_etag(path, stat_result):
+    match = HASHED_NAME_RE.search(path)
+    if match:
+        return f'"{match.group(1)}"'
+    # Keyed by mtime/size so an overwritten file is hashed again
+    return f'"{_content_hash(path, stat_result.st_mtime_ns, stat_result.st_size)}"'
+
+
+def parse_byte_range(header, size):
+    """(start, end) inclusive for a single-range header; None to send the whole file; False if unsatisfiable"""
+    match = _RANGE_RE.match(header.strip())
+    if not match or size == 0:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    try:
+        stat_result = os.stat(full_path)
+    except OSError:
+        raise Http404
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise Http404
+
+    size = stat_result.st_size
+    etag = file_etag(full_path, stat_result)
+    max_age = IMMUTABLE_MAX_AGE if HASHED_NAME_RE.search(path) else MUTABLE_MAX_AGE
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat_result.st_mtime),
+        'Cache-Control': f'public, max-age={max_age}' + (', immutable' if max_age == IMMUTABLE_MAX_AGE else ''),
+        'Accept-Ranges': 'bytes',
+    }
+
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+
+    accel_prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', None)
+    if accel_prefix:
+        # The proxy sends the bytes (and handles Range itself)
+        response = HttpResponse(content_type=content_type, headers=headers)
+        response['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + path
+        return response
+
+    byte_range = None
+    range_header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    if range_header and (if_range is None or if_range == etag):
+        byte_range = parse_byte_range(range_header, size)
+    if byte_range is False:
+        response = HttpResponse(status=416, headers=headers)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type, headers=headers)
+        response['Content-Length'] = str(size)
+        return response
+
+    if byte_range is not None:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            _read_range(full_path, start, length), status=206, content_type=content_type, headers=headers,
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(length)
+        return response
+
+    response = FileResponse(open(full_path, 'rb'), content_type=content_type, headers=headers)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-18 03:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('GuestManagementSystemtApp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['chat_session', 'timestamp'], name='chatmsg_session_ts_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.1 on 2026-10-18 03:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_last_message(apps, schema_editor):
+    ChatBot = apps.get_model('GuestManagementSystemtApp', 'ChatBot')
+    ChatMessage = apps.get_model('GuestManagementSystemtApp', 'ChatMessage')
+    newest = (
+        ChatMessage.objects
+        .filter(chat_session=models.OuterRef('pk'))
+        .order_by('-timestamp', '-id')
+        .values('id')[:1]
+    )
+    ChatBot.objects.update(last_message=models.Subquery(newest))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('GuestManagementSystemtApp', '0002_chatmessage_session_timestamp_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatbot',
+            name='last_message',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='GuestManagementSystemtApp.chatmessage'),
+        ),
+        migrations.RunPython(backfill_last_message, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.1 on 2026-10-18 03:34
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_cart_totals(apps, schema_editor):
+    Cart = apps.get_model('GuestManagementSystemtApp', 'Cart')
+    CartItem = apps.get_model('GuestManagementSystemtApp', 'CartItem')
+    money = models.DecimalField(max_digits=12, decimal_places=2)
+    lines = (
+        CartItem.objects
+        .filter(cart=models.OuterRef('pk'))
+        .values('cart')
+        .annotate(
+            amount=models.Sum(models.F('quantity') * models.F('product__price'), output_field=money),
+            count=models.Sum('quantity'),
+        )
+    )
+    Cart.objects.update(
+        total_amount=Coalesce(models.Subquery(lines.values('amount')), models.Value(0), output_field=money),
+        total_items=Coalesce(models.Subquery(lines.values('count')), models.Value(0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('GuestManagementSystemtApp', '0003_chatbot_last_message'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='total_amount',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='total_items',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_cart_totals, migrations.RunPython.noop),
+    ]
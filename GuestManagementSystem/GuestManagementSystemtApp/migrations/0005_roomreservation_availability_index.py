@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-18 03:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('GuestManagementSystemtApp', '0004_cart_stored_totals'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='roomreservation',
+            index=models.Index(fields=['room', 'status', 'check_in', 'check_out'], name='resv_room_status_dates_idx'),
+        ),
+    ]
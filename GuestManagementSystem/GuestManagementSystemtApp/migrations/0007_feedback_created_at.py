@@ -0,0 +1,20 @@
+# Generated by Django 5.2.1 on 2026-10-18 03:52
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('GuestManagementSystemtApp', '0006_created_at_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feedback',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
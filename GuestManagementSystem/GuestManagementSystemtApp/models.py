@@ -6,6 +6,7 @@ import os
 import random
 from django.contrib.auth.hashers import make_password, check_password
 from django.core.exceptions import ValidationError
+from django.db.models.functions import Coalesce
 
 def product_image_upload_path(instance, filename):
     # Example: products/PRD20250811ABC12345/image.jpg
@@ -45,6 +46,19 @@ class User(models.Model):
     def check_password(self, raw_password):
         return check_password(raw_password, self.password)
 
+    # Staff accounts become request.user through UserTokenAuthentication
+    @property
+    def is_authenticated(self):
+        return True
+
+    @property
+    def is_anonymous(self):
+        return False
+
+    @property
+    def is_staff(self):
+        return True
+
     def __str__(self):
         return self.name
 
@@ -78,7 +92,7 @@ class Customer(AbstractUser):
     marital_status = models.CharField(max_length=1, choices=MARITAL_STATUS_CHOICES, blank=True, null=True)
     location = models.CharField(max_length=255, blank=True, null=True)
     status = models.CharField(max_length=1, choices=STATUS_CHOICES, default='A')
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     groups = models.ManyToManyField(
@@ -162,13 +176,19 @@ class Product(models.Model):
     description = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     image = models.ImageField(upload_to=product_image_upload_path, blank=True, null=True)  
+    # Resized copies of image, filled in by process_product_images ({} until then)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
     
+    @staticmethod
+    def generate_product_code():
+        return f"PRD{timezone.now().strftime('%Y%m%d')}{str(uuid.uuid4())[:8].upper()}"
+
     def save(self, *args, **kwargs):
         if not self.product_code:
             # Generate auto product code
-            self.product_code = f"PRD{timezone.now().strftime('%Y%m%d')}{str(uuid.uuid4())[:8].upper()}"
+            self.product_code = self.generate_product_code()
         super().save(*args, **kwargs)
     
     def __str__(self):
@@ -206,6 +226,10 @@ class RoomReservation(models.Model):
         ('checked_out', 'Checked Out'),
         ('canceled', 'Canceled'),
     ]
+    # Statuses that hold the room for their [check_in, check_out) range
+    ACTIVE_STATUSES = ('pending', 'confirmed', 'checked_in')
+    # Statuses that count as a sold stay in analytics
+    SOLD_STATUSES = ('confirmed', 'checked_in', 'checked_out')
 
     room = models.ForeignKey('Room', on_delete=models.PROTECT, related_name='reservations')
     customer = models.ForeignKey(Customer, on_delete=models.PROTECT, related_name='room_reservations')
@@ -216,11 +240,15 @@ class RoomReservation(models.Model):
     notes = models.TextField(blank=True, default='')
     status = models.CharField(max_length=12, choices=STATUS_CHOICES, default='pending')
 
-    created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # rollup watermark scans
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Overlap probes: room = ? AND status IN (...) AND check_in < ? AND check_out > ?
+            models.Index(fields=['room', 'status', 'check_in', 'check_out'], name='resv_room_status_dates_idx'),
+        ]
 
     def __str__(self):
         return f"Reservation #{self.id} - Room {self.room.room_code} ({self.check_in} → {self.check_out})"
@@ -233,19 +261,48 @@ class RoomReservation(models.Model):
 class Cart(models.Model):
     """Shopping cart for customers"""
     customer = models.OneToOneField(Customer, on_delete=models.CASCADE, related_name='cart')
+    # Stored aggregates of cart_items; call refresh_totals() after changing lines
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    total_items = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return f"Cart for {self.customer.username}"
-    
-    @property
-    def total_amount(self):
-        return sum(item.subtotal for item in self.cart_items.all())
-    
-    @property
-    def total_items(self):
-        return sum(item.quantity for item in self.cart_items.all())
+
+    @staticmethod
+    def refresh_totals_for(queryset):
+        """Recompute stored totals for every cart in ``queryset`` with a single UPDATE"""
+        lines = (
+            CartItem.objects
+            .filter(cart=models.OuterRef('pk'))
+            .values('cart')
+            .annotate(
+                amount=models.Sum(
+                    models.F('quantity') * models.F('product__price'),
+                    output_field=models.DecimalField(max_digits=12, decimal_places=2),
+                ),
+                count=models.Sum('quantity'),
+            )
+        )
+        return queryset.update(
+            total_amount=Coalesce(
+                models.Subquery(lines.values('amount')), models.Value(0),
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            ),
+            total_items=Coalesce(models.Subquery(lines.values('count')), models.Value(0)),
+        )
+
+    def refresh_totals(self):
+        Cart.refresh_totals_for(Cart.objects.filter(pk=self.pk))
+        self.refresh_from_db(fields=['total_amount', 'total_items'])
+
+    def clear(self):
+        """Remove every line and zero the stored totals"""
+        self.cart_items.all().delete()
+        Cart.objects.filter(pk=self.pk).update(total_amount=0, total_items=0)
+        self.total_amount = 0
+        self.total_items = 0
 
 
 class CartItem(models.Model):
@@ -278,14 +335,16 @@ class Order(models.Model):
         ('CA', 'Cancelled'),
         ('R', 'Refunded'),
     ]
+    # Statuses whose orders are left out of revenue figures
+    NON_REVENUE_STATUSES = ('CA', 'R')
     
     order_number = models.CharField(max_length=20, unique=True, editable=False)
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='orders')
     status = models.CharField(max_length=2, choices=STATUS_CHOICES, default='P')
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     notes = models.TextField(blank=True, null=True)
-    created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # rollup watermark scans
     
     def save(self, *args, **kwargs):
         if not self.order_number:
@@ -330,6 +389,11 @@ class ChatBot(models.Model):
         related_name='admin_chat_sessions',
         null=True, blank=True
     )
+    # Denormalized pointer to the newest message, maintained by signals.py
+    last_message = models.ForeignKey(
+        'ChatMessage', on_delete=models.SET_NULL,
+        related_name='+', null=True, blank=True, editable=False
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -358,11 +422,16 @@ class ChatMessage(models.Model):
     
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            # Incremental fetches: WHERE chat_session_id = ? AND timestamp > ? ORDER BY timestamp
+            models.Index(fields=['chat_session', 'timestamp'], name='chatmsg_session_ts_idx'),
+        ]
 
 class Feedback(models.Model):
     """Simple feedback with only name and message."""
     full_name = models.CharField(max_length=150)
     message = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
     def __str__(self):
         return f"{self.full_name}: {self.message[:40]}"
@@ -412,4 +481,87 @@ class Promotion(models.Model):
         return f"{self.title} [{self.get_type_display()}]"
 
     class Meta:
-        ordering = ['-created_at'] 
\ No newline at end of file
+        ordering = ['-created_at'] 
+
+class DailySales(models.Model):
+    """
+    Materialized per-day order revenue, built by the build_daily_rollups command.
+    Each day has one total row (is_total=True, category null), one row per
+    product category, and one row for uncategorized lines (category null).
+    Products in several categories count towards each of them.
+    """
+    date = models.DateField(db_index=True)
+    category = models.ForeignKey(
+        ProductCategory, on_delete=models.CASCADE,
+        related_name='daily_sales', null=True, blank=True
+    )
+    is_total = models.BooleanField(default=False)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    items = models.PositiveIntegerField(default=0)
+    orders = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['date']
+        verbose_name_plural = "Daily Sales"
+
+    def __str__(self):
+        scope = 'Total' if self.is_total else (self.category or 'Uncategorized')
+        return f"{self.date} {scope}: {self.revenue}"
+
+
+class DailyOccupancy(models.Model):
+    """Materialized per-night occupancy for one room category, built by build_daily_rollups"""
+    date = models.DateField()
+    room_category = models.CharField(max_length=1, choices=Room.CATEGORY_CHOICES)
+    rooms = models.PositiveIntegerField(default=0)
+    sold_nights = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['date', 'room_category']
+        verbose_name_plural = "Daily Occupancy"
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'room_category'], name='daily_occupancy_unique_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.get_room_category_display()}: {self.sold_nights}/{self.rooms}"
+
+
+class RollupWatermark(models.Model):
+    """How far an incremental rollup job has processed source rows"""
+    name = models.CharField(max_length=50, unique=True)
+    processed_until = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name} @ {self.processed_until}"
+
+
+class EmailOutbox(models.Model):
+    """Email written in the same transaction as the change it reports, sent later by send_outbox_emails"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254, blank=True)
+    recipient = models.EmailField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        verbose_name_plural = "Email Outbox"
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.recipient} ({self.status})"
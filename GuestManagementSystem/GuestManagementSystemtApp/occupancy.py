@@ -0,0 +1,53 @@
+"""
+Single source of truth for ``Room.reserved``.
+
+A room is reserved when an active reservation covers tonight, i.e.
+check_in <= today < check_out. Write paths call ``reservation_changed`` so the
+flag is corrected incrementally (and only when the stay touches today); the
+``reconcile_room_occupancy`` management command runs at the day boundary to
+roll every room forward in one set-based UPDATE.
+"""
+from datetime import timedelta
+
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .availability import overlapping_reservations
+from .models import Room
+
+
+def _occupied_tonight(today):
+    return overlapping_reservations(today, today + timedelta(days=1))
+
+
+def covers_today(reservation, today=None):
+    today = today or timezone.localdate()
+    return reservation.check_in <= today < reservation.check_out
+
+
+def sync_room(room, today=None):
+    """Recompute one room's flag; writes only if it actually changed"""
+    today = today or timezone.localdate()
+    occupied = _occupied_tonight(today).filter(room=room).exists()
+    if occupied != room.reserved:
+        Room.objects.filter(pk=room.pk).update(reserved=occupied)
+        room.reserved = occupied
+    return occupied
+
+
+def reservation_changed(reservation, today=None):
+    """Call after creating a reservation or changing its status/dates"""
+    today = today or timezone.localdate()
+    if covers_today(reservation, today):
+        sync_room(reservation.room, today)
+
+
+def reconcile_all(today=None):
+    """Bring every room's flag in line with tonight's reservations; returns rows changed"""
+    today = today or timezone.localdate()
+    occupied = Exists(_occupied_tonight(today).filter(room=OuterRef('pk')))
+    return (
+        Room.objects
+        .filter(Q(~occupied, reserved=True) | Q(occupied, reserved=False))
+        .update(reserved=occupied)
+    )
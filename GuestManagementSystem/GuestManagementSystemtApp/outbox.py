@@ -0,0 +1,128 @@
+"""
+Transactional email outbox.
+
+Request handlers call ``enqueue_email`` inside the transaction that makes the
+change, so the email exists exactly when the change commits and the request
+never waits on SMTP. The ``send_outbox_emails`` command drains due rows in
+batches over one SMTP connection. A failed send is retried with exponential
+backoff until ``MAX_ATTEMPTS``, after which the row is left as 'failed'.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import EmailOutbox
+
+
+MAX_ATTEMPTS = 5
+
+# Seconds before the first retry; doubled on every further failure
+RETRY_BACKOFF = 60
+
+# Claimed rows are hidden from other workers this long, then become due again
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+
+def build_email(subject, body, recipient, from_email=None):
+    """Unsaved outbox row, for enqueue_emails"""
+    return EmailOutbox(
+        subject=subject,
+        body=body,
+        recipient=recipient,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+    )
+
+
+def enqueue_email(subject, body, recipient, from_email=None):
+    email = build_email(subject, body, recipient, from_email)
+    email.save()
+    return email
+
+
+def enqueue_emails(emails):
+    """Queue several build_email() rows with one INSERT"""
+    return EmailOutbox.objects.bulk_create(emails)
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=RETRY_BACKOFF * 2 ** (attempts - 1))
+
+
+def claim_batch(batch_size):
+    """Lock up to ``batch_size`` due rows for this worker"""
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            EmailOutbox.objects
+            .select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        EmailOutbox.objects.filter(id__in=ids).update(next_attempt_at=now + CLAIM_TIMEOUT)
+    return list(EmailOutbox.objects.filter(id__in=ids).order_by('id'))
+
+
+def _record_failure(entry, error):
+    entry.attempts += 1
+    entry.last_error = error
+    if entry.attempts >= MAX_ATTEMPTS:
+        entry.status = 'failed'
+    else:
+        entry.next_attempt_at = timezone.now() + retry_delay(entry.attempts)
+    entry.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+
+def send_batch(batch_size=50):
+    """Send one batch of due emails; returns (sent, failed) counts"""
+    entries = claim_batch(batch_size)
+    if not entries:
+        return 0, 0
+
+    sent = failed = 0
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as exc:
+        for entry in entries:
+            _record_failure(entry, f'Connection failed: {exc}')
+        return 0, len(entries)
+
+    try:
+        for entry in entries:
+            message = EmailMessage(
+                subject=entry.subject,
+                body=entry.body,
+                from_email=entry.from_email or None,
+                to=[entry.recipient],
+                connection=connection,
+            )
+            try:
+                message.send()
+            except Exception as exc:
+                _record_failure(entry, str(exc))
+                failed += 1
+            else:
+                entry.status = 'sent'
+                entry.attempts += 1
+                entry.sent_at = timezone.now()
+                entry.last_error = ''
+                entry.save(update_fields=['status', 'attempts', 'sent_at', 'last_error'])
+                sent += 1
+    finally:
+        connection.close()
+    return sent, failed
+
+
+def drain_outbox(batch_size=50):
+    """Send batches until nothing is due; returns (sent, failed) totals"""
+    sent = failed = 0
+    while True:
+        batch_sent, batch_failed = send_batch(batch_size)
+        if not batch_sent and not batch_failed:
+            return sent, failed
+        sent += batch_sent
+        failed += batch_failed
@@ -0,0 +1,72 @@
+"""
+Project-wide pagination.
+
+Every class here is opt-in: a list endpoint only paginates when the client
+sends one of the pagination query parameters, so existing callers that
+expect a plain JSON array keep working. Large, append-mostly tables use
+keyset (cursor) pagination, which stays O(page) however deep the client
+scrolls; small tables use page numbers. Keyset lists still answer ?page=
+(as the admin screens send it) with page numbers over the same ordering.
+"""
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class OptInPaginationMixin:
+    """Skip pagination unless one of ``trigger_params`` is in the query string"""
+    trigger_params = ()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not any(param in request.query_params for param in self.trigger_params):
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+class OptionalPageNumberPagination(OptInPaginationMixin, PageNumberPagination):
+    """?page= / ?page_size= (default for the project)"""
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    trigger_params = ('page', 'page_size')
+
+
+class KeysetPagination(OptInPaginationMixin, CursorPagination):
+    """?cursor= / ?page_size=, newest first"""
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    trigger_params = ('cursor', 'page', 'page_size')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_numbers = None
+        if 'page' in request.query_params and 'cursor' not in request.query_params:
+            # Page-number callers get the offset paging they expect, in cursor order
+            self.page_numbers = OptionalPageNumberPagination()
+            self.page_numbers.max_page_size = self.max_page_size
+            ordered = queryset.order_by(*self.get_ordering(request, queryset, view))
+            return self.page_numbers.paginate_queryset(ordered, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.page_numbers is not None:
+            return self.page_numbers.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class IdKeysetPagination(KeysetPagination):
+    """Keyset pagination for tables without a created_at column"""
+    ordering = '-id'
+
+
+class ChronologicalKeysetPagination(KeysetPagination):
+    """Oldest first, for chat transcripts"""
+    ordering = ('timestamp', 'id')
+
+
+class KeysetOrderingFilter(OrderingFilter):
+    """OrderingFilter that always ends on id, so a keyset cursor never sits on a tie"""
+
+    def get_ordering(self, request, queryset, view):
+        ordering = list(super().get_ordering(request, queryset, view) or ())
+        if not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            ordering.append('-id' if ordering and ordering[0].startswith('-') else 'id')
+        return ordering
@@ -0,0 +1,330 @@
+"""
+Bulk product import and export as CSV or JSON Lines.
+
+Import reads the file line by line and works through it ``CHUNK_SIZE`` rows
+at a time: each chunk is validated, existing products are looked up by
+product_code in one query, and the rows are written with one upserting
+bulk_create plus one bulk_create of category through-rows. Category names
+are resolved against a single name -> id map read up front. The whole file
+is one transaction: if any row is invalid nothing is written, and the first
+``MAX_ERRORS`` problems are reported with their line numbers.
+
+bulk_create sends no signals, so the import refreshes the stored totals of
+carts holding a repriced product itself, and a successful import bumps the
+catalog, search, autocomplete and dashboard versions.
+
+Export pages through products by id and yields one rendered chunk at a
+time, so it streams in constant memory; its output imports back as is.
+"""
+import codecs
+import csv
+import io
+import json
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import as_serializer_error
+
+from .autocomplete import indexes as autocomplete_indexes
+from .catalog import invalidate_catalog
+from .models import Cart, CartItem, Product, ProductCategory
+from .search import product_index
+from .serializers import ProductImportSerializer
+from .stats import invalidate_dashboard_stats
+
+
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+CONTENT_TYPE_FORMATS = {
+    'text/csv': 'csv',
+    'application/csv': 'csv',
+    'application/x-ndjson': 'jsonl',
+    'application/jsonl': 'jsonl',
+    'application/json-lines': 'jsonl',
+}
+
+FIELDS = ['product_code', 'name', 'categories', 'cost', 'price', 'quantity', 'description', 'is_active']
+
+# Separates category names inside the CSV categories column
+CATEGORY_SEPARATOR = '|'
+
+CHUNK_SIZE = 1000
+EXPORT_CHUNK_SIZE = 2000
+MAX_ERRORS = 100
+
+# Defaults for optional fields of new products
+NEW_PRODUCT_DEFAULTS = {'quantity': 0, 'description': None, 'is_active': True}
+
+Through = Product.categories.through
+
+
+class ImportFileError(ValueError):
+    """The file as a whole can't be read (encoding, CSV syntax)"""
+
+
+def format_for(filename=None, content_type=None):
+    """'csv'/'jsonl' from a file extension or content type, None if neither says"""
+    if filename:
+        extension = filename.rsplit('.', 1)[-1].lower()
+        if extension in FORMATS:
+            return extension
+        if extension in ('ndjson', 'json'):
+            return 'jsonl'
+    if content_type:
+        return CONTENT_TYPE_FORMATS.get(content_type.split(';')[0].strip().lower())
+    return None
+
+
+# ============================================================================
+# READING
+# ============================================================================
+
+def decode_lines(byte_lines):
+    """Text lines from an iterable of byte lines (a file, an upload, a request body)"""
+    return codecs.iterdecode(byte_lines, 'utf-8-sig')
+
+
+def read_csv(lines):
+    """(line_number, row) pairs
+
+    Empty cells count as left out, except in a categories column, where an
+    empty cell means no categories (so an exported product without any
+    re-imports without any).
+    """
+    reader = csv.DictReader(lines)
+    for row in reader:
+        # None when there is no categories column (or the row stops short of it)
+        categories = row.get('categories')
+        # Cells past the header land under the None key
+        row = {key: value for key, value in row.items() if key and value not in ('', None)}
+        if categories is not None:
+            row['categories'] = [
+                name.strip() for name in categories.split(CATEGORY_SEPARATOR) if name.strip()
+            ]
+        yield reader.line_num, row
+
+
+def read_jsonl(lines):
+    """(line_number, row) pairs; a line that isn't JSON gives a None row"""
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, None
+
+
+READERS = {'csv': read_csv, 'jsonl': read_jsonl}
+
+
+def read_rows(byte_lines, file_format):
+    return READERS[file_format](decode_lines(byte_lines))
+
+
+# ============================================================================
+# IMPORT
+# ============================================================================
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _validate(serializer, chunk, categories, seen_codes, errors):
+    """Validated rows of ``chunk`` with category ids resolved; problems go to ``errors``"""
+    valid = []
+    for line, row in chunk:
+        if row is None:
+            errors.append({'line': line, 'errors': {'non_field_errors': ['Invalid JSON.']}})
+            continue
+        # One serializer for every row, as a ListSerializer does: building its fields is the costly part
+        try:
+            data = serializer.run_validation(row)
+        except ValidationError as exc:
+            errors.append({'line': line, 'errors': as_serializer_error(exc)})
+            continue
+
+        code = data.get('product_code')
+        if code is not None:
+            if code in seen_codes:
+                errors.append({'line': line, 'errors': {'product_code': ['Duplicate product_code in file.']}})
+                continue
+            seen_codes.add(code)
+
+        names = data.get('categories')
+        if names is not None:
+            unknown = [name for name in names if name not in categories]
+            if unknown:
+                errors.append({'line': line, 'errors': {'categories': [f"Unknown category: {', '.join(unknown)}"]}})
+                continue
+            data['category_ids'] = {categories[name] for name in names}
+        valid.append(data)
+    return valid
+
+
+def _write(rows):
+    """Upsert one chunk of validated rows; returns (created, updated)"""
+    codes = [row['product_code'] for row in rows if 'product_code' in row]
+    existing = {
+        current['product_code']: current for current in
+        Product.objects.filter(product_code__in=codes).values('product_code', 'price', *NEW_PRODUCT_DEFAULTS)
+    }
+
+    products = []
+    for row in rows:
+        code = row.get('product_code') or Product.generate_product_code()
+        row['product_code'] = code
+        kept = existing.get(code, NEW_PRODUCT_DEFAULTS)
+        products.append(Product(
+            product_code=code,
+            name=row['name'],
+            cost=row['cost'],
+            price=row['price'],
+            quantity=row.get('quantity', kept['quantity']),
+            description=row.get('description', kept['description']),
+            is_active=row.get('is_active', kept['is_active']),
+        ))
+    Product.objects.bulk_create(
+        products,
+        update_conflicts=True,
+        unique_fields=['product_code'],
+        update_fields=['name', 'cost', 'price', 'quantity', 'description', 'is_active', 'updated_at'],
+    )
+
+    # Not every backend returns ids from an upsert, so read them back
+    ids = dict(
+        Product.objects.filter(product_code__in=[row['product_code'] for row in rows])
+        .values_list('product_code', 'id')
+    )
+    with_categories = [row for row in rows if 'category_ids' in row]
+    Through.objects.filter(
+        product_id__in=[ids[row['product_code']] for row in with_categories if row['product_code'] in existing]
+    ).delete()
+    Through.objects.bulk_create([
+        Through(product_id=ids[row['product_code']], productcategory_id=category_id)
+        for row in with_categories for category_id in row['category_ids']
+    ])
+
+    # Stored cart totals follow product prices; bulk_create skips the post_save that refreshes them
+    repriced = [
+        ids[row['product_code']] for row in rows
+        if row['product_code'] in existing and row['price'] != existing[row['product_code']]['price']
+    ]
+    if repriced:
+        Cart.refresh_totals_for(
+            Cart.objects.filter(id__in=CartItem.objects.filter(product_id__in=repriced).values('cart_id'))
+        )
+
+    created = sum(1 for row in rows if row['product_code'] not in existing)
+    return created, len(rows) - created
+
+
+def _invalidate_product_caches():
+    invalidate_catalog()
+    product_index.invalidate()
+    autocomplete_indexes['product'].invalidate()
+    invalidate_dashboard_stats()
+
+
+def import_products(rows, dry_run=False, chunk_size=CHUNK_SIZE):
+    """Create or update products from (line_number, row) pairs
+
+    Returns {'created', 'updated', 'errors'}; nothing is written if there are
+    errors or ``dry_run`` is set (the counts then say what would have happened).
+    """
+    serializer = ProductImportSerializer()
+    categories = dict(ProductCategory.objects.values_list('name', 'id'))
+    seen_codes = set()
+    errors = []
+    created = updated = 0
+
+    try:
+        with transaction.atomic():
+            for chunk in _chunks(rows, chunk_size):
+                valid = _validate(serializer, chunk, categories, seen_codes, errors)
+                if errors:
+                    # Keep validating to report more problems, but stop writing
+                    if len(errors) >= MAX_ERRORS:
+                        break
+                    continue
+                chunk_created, chunk_updated = _write(valid)
+                created += chunk_created
+                updated += chunk_updated
+
+            if errors or dry_run:
+                transaction.set_rollback(True)
+            else:
+                transaction.on_commit(_invalidate_product_caches)
+    except UnicodeDecodeError as exc:
+        raise ImportFileError(f'File is not UTF-8: {exc}') from exc
+    except csv.Error as exc:
+        raise ImportFileError(f'Malformed CSV: {exc}') from exc
+
+    return {'created': created, 'updated': updated, 'errors': errors[:MAX_ERRORS]}
+
+
+# ============================================================================
+# EXPORT
+# ============================================================================
+
+def export_rows(queryset=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Lists of row dicts in ``FIELDS`` order, one list per chunk of products"""
+    queryset = Product.objects.all() if queryset is None else queryset
+    last_id = 0
+    while True:
+        products = list(
+            queryset.filter(id__gt=last_id).order_by('id')
+            .values('id', *(field for field in FIELDS if field != 'categories'))[:chunk_size]
+        )
+        if not products:
+            return
+        last_id = products[-1]['id']
+
+        categories = {}
+        for product_id, name in Through.objects.filter(
+            product_id__in=[product['id'] for product in products]
+        ).order_by('productcategory__name').values_list('product_id', 'productcategory__name'):
+            categories.setdefault(product_id, []).append(name)
+
+        yield [
+            {field: categories.get(product['id'], []) if field == 'categories' else product[field] for field in FIELDS}
+            for product in products
+        ]
+
+
+def export_csv(chunks):
+    yield ','.join(FIELDS) + '\r\n'
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for rows in chunks:
+        for row in rows:
+            writer.writerow([
+                CATEGORY_SEPARATOR.join(row['categories']) if field == 'categories'
+                else ('true' if row[field] else 'false') if field == 'is_active'
+                else row[field]
+                for field in FIELDS
+            ])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def export_jsonl(chunks):
+    for rows in chunks:
+        yield ''.join(json.dumps(row, cls=DjangoJSONEncoder) + '\n' for row in rows)
+
+
+EXPORTERS = {'csv': export_csv, 'jsonl': export_jsonl}
+
+
+def export_products(file_format, queryset=None):
+    """Yield the export file in ``file_format`` as text pieces"""
+    return EXPORTERS[file_format](export_rows(queryset))
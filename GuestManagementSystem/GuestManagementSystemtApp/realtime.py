@@ -0,0 +1,175 @@
+"""
+In-process pub/sub used to push chat messages to connected clients.
+
+``LocalBroker`` is a stand-in for an external broker (e.g. Redis pub/sub): it
+fans published payloads out to every subscriber of a channel in this process.
+``ChatHub`` maps chat sessions onto broker channels and is what the rest of
+the app talks to.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+from rest_framework.renderers import JSONRenderer
+
+
+# Seconds between SSE comment lines sent to keep idle connections open
+KEEPALIVE_SECONDS = 15
+
+# Messages buffered per subscriber before the stream is dropped; the client
+# reconnects with Last-Event-ID and the gap is replayed from the database.
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class Subscription:
+    """A single listener bound to the event loop that created it"""
+
+    OVERFLOW = object()
+
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def deliver(self, payload):
+        # Always runs on self.loop
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            self.queue.get_nowait()
+            self.queue.put_nowait(self.OVERFLOW)
+
+    async def get(self, timeout=None):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """Thread-safe, in-memory channel fan-out"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel)
+        with self._lock:
+            self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is None:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.channel]
+
+    def subscriber_count(self, channel):
+        with self._lock:
+            return len(self._subscribers.get(channel, ()))
+
+    def publish(self, channel, payload):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, payload)
+            except RuntimeError:
+                # Event loop already closed; the connection is gone
+                self.unsubscribe(subscription)
+
+
+class ChatHub:
+    """Publishes new ChatMessage rows to per-session and global channels"""
+
+    ALL_SESSIONS = 'chat.sessions'
+
+    def __init__(self, broker=None):
+        self.broker = broker or LocalBroker()
+
+    @staticmethod
+    def session_channel(session_id):
+        return f'chat.session.{session_id}'
+
+    def subscribe(self, session_id=None):
+        channel = self.ALL_SESSIONS if session_id is None else self.session_channel(session_id)
+        return self.broker.subscribe(channel)
+
+    def publish_message(self, message):
+        payload = message_payload(message)
+        self.broker.publish(self.session_channel(message.chat_session_id), payload)
+        self.broker.publish(self.ALL_SESSIONS, payload)
+
+
+chat_hub = ChatHub()
+
+
+def message_payload(message):
+    """Serialize a ChatMessage once so every subscriber shares the same JSON"""
+    from .serializers import ChatMessageSerializer
+
+    return {
+        'id': message.id,
+        'data': JSONRenderer().render(ChatMessageSerializer(message).data).decode(),
+    }
+
+
+def format_sse(data, event_id=None, event=None):
+    """Encode one Server-Sent Events frame"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    if event:
+        lines.append(f'event: {event}')
+    lines.extend(f'data: {line}' for line in data.splitlines() or [''])
+    return '\n'.join(lines) + '\n\n'
+
+
+async def _backlog(session_id, last_id):
+    from .models import ChatMessage
+
+    qs = ChatMessage.objects.filter(id__gt=last_id).order_by('id')
+    if session_id is not None:
+        qs = qs.filter(chat_session_id=session_id)
+    return [message_payload(msg) async for msg in qs]
+
+
+async def chat_event_stream(session_id=None, last_id=None):
+    """
+    Yield SSE frames: first the messages after ``last_id`` replayed from the
+    database, then live ones. The subscription is taken before the backlog is
+    read, and payloads already sent (id <= last_id) are skipped, which covers
+    the window in between. It is opened and closed inside the generator, so a
+    stream that is never iterated, or fails part way, never leaks one.
+    """
+    subscription = chat_hub.subscribe(session_id)
+    try:
+        yield 'retry: 3000\n\n'
+        backlog = await _backlog(session_id, last_id) if last_id is not None else []
+        last_id = last_id or 0
+        for payload in backlog:
+            last_id = payload['id']
+            yield format_sse(payload['data'], event_id=payload['id'], event='message')
+        while True:
+            try:
+                payload = await subscription.get(timeout=KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            if payload is Subscription.OVERFLOW:
+                break
+            if payload['id'] <= last_id:
+                continue
+            last_id = payload['id']
+            yield format_sse(payload['data'], event_id=payload['id'], event='message')
+    finally:
+        subscription.close()
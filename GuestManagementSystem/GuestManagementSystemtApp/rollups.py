@@ -0,0 +1,181 @@
+"""
+Incremental daily rollups (DailySales, DailyOccupancy).
+
+Each run looks only at orders and reservations whose ``updated_at`` moved past
+the stored watermark, turns them into the set of calendar days they touch,
+and rebuilds just those days (plus the days that went by since the previous
+run, so every day below the horizon has occupancy rows). Historical analytics then read the small rollup
+tables instead of scanning Order, OrderItem and RoomReservation.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import (
+    DailyOccupancy, DailySales, Order, OrderItem, Room, RoomReservation, RollupWatermark,
+)
+
+
+WATERMARK_NAME = 'daily_rollups'
+
+# Days rebuilt per transaction
+CHUNK_DAYS = 31
+
+
+def window_bounds(start, end):
+    """Aware datetimes for midnight at the start of ``start`` and ``end``"""
+    tz = timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.combine(start, time.min), tz),
+        timezone.make_aware(datetime.combine(end, time.min), tz),
+    )
+
+
+def rollup_horizon():
+    """First day not yet final in the rollups (None if they were never built)"""
+    watermark = RollupWatermark.objects.filter(name=WATERMARK_NAME).first()
+    if watermark is None:
+        return None
+    return timezone.localdate(watermark.processed_until)
+
+
+def rollup_start():
+    """First day with rollup rows (None if they were never built)"""
+    return DailyOccupancy.objects.order_by('date').values_list('date', flat=True).first()
+
+
+def _first_activity_day():
+    days = [
+        timezone.localdate(first) for first in
+        Order.objects.order_by('created_at').values_list('created_at', flat=True)[:1]
+    ]
+    days += RoomReservation.objects.order_by('check_in').values_list('check_in', flat=True)[:1]
+    return min(days, default=None)
+
+
+def _day_range(start, end):
+    return {start + timedelta(days=i) for i in range((end - start).days)}
+
+
+def changed_days(since=None):
+    """Calendar days touched by orders/reservations updated at or after ``since`` (all when None)"""
+    orders = Order.objects.all()
+    reservations = RoomReservation.objects.all()
+    if since is not None:
+        orders = orders.filter(updated_at__gte=since)
+        reservations = reservations.filter(updated_at__gte=since)
+
+    days = set(
+        orders.annotate(day=TruncDate('created_at')).values_list('day', flat=True).distinct()
+    )
+    for check_in, check_out in reservations.values_list('check_in', 'check_out').iterator():
+        days.update(_day_range(check_in, check_out))
+    return days
+
+
+def _sales_rows(days):
+    line_total = ExpressionWrapper(
+        F('quantity') * F('price'), output_field=DecimalField(max_digits=14, decimal_places=2)
+    )
+    lo, hi = window_bounds(min(days), max(days) + timedelta(days=1))
+    items = (
+        OrderItem.objects
+        .filter(order__created_at__gte=lo, order__created_at__lt=hi)
+        .annotate(day=TruncDate('order__created_at'))
+        .filter(day__in=days)
+        .exclude(order__status__in=Order.NON_REVENUE_STATUSES)
+    )
+    rows = [
+        DailySales(
+            date=row['day'], is_total=True,
+            revenue=row['revenue'], items=row['items'], orders=row['orders'],
+        )
+        for row in items.values('day').annotate(
+            revenue=Sum(line_total), items=Sum('quantity'), orders=Count('order', distinct=True)
+        )
+    ]
+    rows += [
+        DailySales(
+            date=row['day'], category_id=row['product__categories'],
+            revenue=row['revenue'], items=row['items'], orders=row['orders'],
+        )
+        for row in items.values('day', 'product__categories').annotate(
+            revenue=Sum(line_total), items=Sum('quantity'), orders=Count('order', distinct=True)
+        )
+    ]
+    return rows
+
+
+def _occupancy_rows(days):
+    codes = [code for code, _ in Room.CATEGORY_CHOICES]
+    index = {code: i for i, code in enumerate(codes)}
+    room_counts = dict(
+        Room.objects.filter(is_active=True).values_list('categories').annotate(n=Count('id'))
+    )
+
+    first, last = min(days), max(days)
+    stays = list(
+        RoomReservation.objects
+        .filter(status__in=RoomReservation.SOLD_STATUSES, check_in__lte=last, check_out__gt=first)
+        .values_list('room__categories', 'check_in', 'check_out', 'total_amount')
+    )
+    if stays:
+        category, check_in, check_out, amount = zip(*stays)
+        category = np.array([index[c] for c in category])
+        check_in = np.array([d.toordinal() for d in check_in])
+        check_out = np.array([d.toordinal() for d in check_out])
+        nightly = np.array(amount, dtype=float) / np.maximum(check_out - check_in, 1)
+
+    rows = []
+    for day in sorted(days):
+        sold = revenue = np.zeros(len(codes))
+        if stays:
+            ordinal = day.toordinal()
+            staying = (check_in <= ordinal) & (check_out > ordinal)
+            sold = np.bincount(category[staying], minlength=len(codes))
+            revenue = np.bincount(category[staying], weights=nightly[staying], minlength=len(codes))
+        for i, code in enumerate(codes):
+            rows.append(DailyOccupancy(
+                date=day, room_category=code, rooms=room_counts.get(code, 0),
+                sold_nights=int(sold[i]), revenue=Decimal(f'{revenue[i]:.2f}'),
+            ))
+    return rows
+
+
+def rebuild_days(days):
+    """Replace the rollup rows of ``days``, CHUNK_DAYS at a time"""
+    days = sorted(days)
+    for start in range(0, len(days), CHUNK_DAYS):
+        chunk = days[start:start + CHUNK_DAYS]
+        sales = _sales_rows(chunk)
+        occupancy = _occupancy_rows(chunk)
+        with transaction.atomic():
+            DailySales.objects.filter(date__in=chunk).delete()
+            DailyOccupancy.objects.filter(date__in=chunk).delete()
+            DailySales.objects.bulk_create(sales)
+            DailyOccupancy.objects.bulk_create(occupancy)
+
+
+def build_rollups(full=False):
+    """Rebuild every day changed since the watermark (or everything); returns the days rebuilt"""
+    # Taken before reading so rows changed mid-run are picked up next time
+    run_started = timezone.now()
+    watermark = RollupWatermark.objects.filter(name=WATERMARK_NAME).first()
+    since = None if full or watermark is None else watermark.processed_until
+
+    days = changed_days(since)
+    # Days that closed since the last run get rows even without any activity
+    first = timezone.localdate(since) if since else _first_activity_day()
+    if first is not None:
+        days |= _day_range(first, timezone.localdate(run_started) + timedelta(days=1))
+    if days:
+        rebuild_days(days)
+    RollupWatermark.objects.update_or_create(
+        name=WATERMARK_NAME, defaults={'processed_until': run_started}
+    )
+    return days
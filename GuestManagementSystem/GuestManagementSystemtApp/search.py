@@ -0,0 +1,229 @@
+"""
+In-process full-text index over active products.
+
+Product name, category names and description are tokenized into an inverted
+index (term -> {product_id: weight}); name hits weigh more than category hits,
+which weigh more than description hits. A query term matches a product by
+exact term, by prefix (sorted term list + bisect) or, when neither finds
+anything, within one edit (a map from single-character deletions to terms).
+Every query term must match. Scores add up field weight times IDF.
+
+Product writes update this process's index on commit. A shared version
+counter in the cache tells each process whether another one changed the
+catalog since, in which case the index is rebuilt on the next search.
+"""
+import math
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from .models import Product
+from .versioning import bump_version, get_version
+
+
+SEARCH_VERSION_KEY = 'search:version'
+
+FIELD_WEIGHTS = {'name': 3.0, 'category': 2.0, 'description': 1.0}
+
+# Relative score of a prefix or one-typo match against an exact term
+PREFIX_FACTOR = 0.7
+FUZZY_FACTOR = 0.5
+
+# Terms one query prefix may expand to
+MAX_PREFIX_EXPANSIONS = 50
+
+# Shortest query term that gets typo tolerance
+MIN_FUZZY_LENGTH = 4
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    if not text:
+        return []
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _deletes(term):
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+def search_version():
+    return get_version(SEARCH_VERSION_KEY)
+
+
+def bump_search_version():
+    return bump_version(SEARCH_VERSION_KEY)
+
+
+class ProductSearchIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.version = None
+        self._clear()
+
+    def _clear(self):
+        self._postings = defaultdict(dict)
+        self._doc_terms = {}
+        self._terms = []
+        self._delete_map = defaultdict(set)
+
+    # -- building -----------------------------------------------------------
+
+    def _document(self, name, description, category_names):
+        weights = defaultdict(float)
+        for field, texts in (
+            ('name', [name]), ('category', category_names), ('description', [description]),
+        ):
+            for text in texts:
+                for term in tokenize(text):
+                    weights[term] += FIELD_WEIGHTS[field]
+        return weights
+
+    def _add(self, product_id, weights):
+        self._remove(product_id)
+        for term, weight in weights.items():
+            if term not in self._postings:
+                insort(self._terms, term)
+                for variant in _deletes(term):
+                    self._delete_map[variant].add(term)
+            self._postings[term][product_id] = weight
+        self._doc_terms[product_id] = list(weights)
+
+    def _remove(self, product_id):
+        # Emptied terms stay in the term list/delete map; lookups skip them
+        for term in self._doc_terms.pop(product_id, ()):
+            self._postings[term].pop(product_id, None)
+
+    def rebuild(self, version=None):
+        version = search_version() if version is None else version
+        category_names = defaultdict(list)
+        for product_id, name in Product.categories.through.objects.filter(
+            product__is_active=True
+        ).values_list('product_id', 'productcategory__name'):
+            category_names[product_id].append(name)
+        products = Product.objects.filter(is_active=True).values_list('id', 'name', 'description')
+
+        postings = defaultdict(dict)
+        doc_terms = {}
+        for product_id, name, description in products.iterator():
+            weights = self._document(name, description, category_names[product_id])
+            for term, weight in weights.items():
+                postings[term][product_id] = weight
+            doc_terms[product_id] = list(weights)
+        delete_map = defaultdict(set)
+        for term in postings:
+            for variant in _deletes(term):
+                delete_map[variant].add(term)
+
+        with self._lock:
+            self._postings = postings
+            self._doc_terms = doc_terms
+            self._terms = sorted(postings)
+            self._delete_map = delete_map
+            self.version = version
+
+    def ensure_current(self):
+        version = search_version()
+        if version != self.version:
+            self.rebuild(version)
+
+    def refresh_products(self, product_ids):
+        """Re-read ``product_ids`` after a committed write in this process"""
+        products = (
+            Product.objects.filter(id__in=product_ids)
+            .prefetch_related('categories')
+            .only('id', 'name', 'description', 'is_active')
+        )
+        documents = {
+            product.id: self._document(
+                product.name, product.description, [c.name for c in product.categories.all()],
+            )
+            for product in products if product.is_active
+        }
+        with self._lock:
+            version = bump_search_version()
+            if self.version is None or version != self.version + 1:
+                # Someone else changed the catalog too; rebuild on the next search
+                return
+            for product_id in product_ids:
+                if product_id in documents:
+                    self._add(product_id, documents[product_id])
+                else:
+                    self._remove(product_id)
+            self.version = version
+
+    def invalidate(self):
+        """Make every process rebuild before its next search"""
+        bump_search_version()
+
+    # -- querying -----------------------------------------------------------
+
+    def _live(self, term):
+        return bool(self._postings.get(term))
+
+    def _variants(self, token):
+        """(term, factor) pairs a query token matches"""
+        variants = []
+        if self._live(token):
+            variants.append((token, 1.0))
+
+        index = bisect_left(self._terms, token)
+        expansions = 0
+        while index < len(self._terms) and expansions < MAX_PREFIX_EXPANSIONS:
+            term = self._terms[index]
+            if not term.startswith(token):
+                break
+            if term != token and self._live(term):
+                variants.append((term, PREFIX_FACTOR))
+                expansions += 1
+            index += 1
+
+        if not variants and len(token) >= MIN_FUZZY_LENGTH:
+            candidates = set(self._delete_map.get(token, ()))
+            for variant in _deletes(token) | {token}:
+                candidates |= self._delete_map.get(variant, set())
+                if self._live(variant):
+                    candidates.add(variant)
+            variants.extend((term, FUZZY_FACTOR) for term in candidates if self._live(term))
+        return variants
+
+    def search(self, query):
+        """Product ids matching every term of ``query``, best first"""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        with self._lock:
+            total = max(len(self._doc_terms), 1)
+            scores = None
+            for token in tokens:
+                token_scores = {}
+                for term, factor in self._variants(token):
+                    postings = self._postings[term]
+                    idf = math.log(1 + total / len(postings))
+                    for product_id, weight in postings.items():
+                        score = weight * idf * factor
+                        if score > token_scores.get(product_id, 0):
+                            token_scores[product_id] = score
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {
+                        product_id: score + token_scores[product_id]
+                        for product_id, score in scores.items() if product_id in token_scores
+                    }
+                if not scores:
+                    return []
+        return sorted(scores, key=lambda product_id: (-scores[product_id], product_id))
+
+
+product_index = ProductSearchIndex()
+
+
+def search_product_ids(query):
+    product_index.ensure_current()
+    return product_index.search(query)
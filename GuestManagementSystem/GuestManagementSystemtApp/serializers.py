@@ -1,8 +1,9 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
-from django.contrib.auth.hashers import check_password
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
+from django.db import transaction
+from django.core.files.storage import default_storage
 from datetime import date
 
 from .models import Room, RoomReservation
@@ -12,59 +13,23 @@ from .models import (
     User, Customer, ProductCategory, Product, Room, Cart, CartItem,
     Order, OrderItem, ChatBot, ChatMessage, Feedback, AIInsight,Promotion
 )
+from .authentication import resolve_login
+from .availability import is_room_available
+from .occupancy import reservation_changed
 # ============================================================================
 # AUTHENTICATION SERIALIZERS
 # ============================================================================
 
-class CustomerLoginSerializer(serializers.Serializer):
+class LoginSerializer(serializers.Serializer):
+    """Credentials for either a staff User or a Customer"""
     email = serializers.EmailField()
     password = serializers.CharField(write_only=True)
 
     def validate(self, attrs):
-        email = attrs.get('email')
-        password = attrs.get('password')
-
-        if not email or not password:
-            raise serializers.ValidationError(_('Must include email and password'))
-        
-        try:
-            customer = Customer.objects.get(email=email)
-        except Customer.DoesNotExist:
-            raise serializers.ValidationError(_('Invalid credentials'))
-        
-        if not customer.is_active:
-            raise serializers.ValidationError(_('Customer account is inactive'))
-        
-        if not check_password(password, customer.password):
-            raise serializers.ValidationError(_('Invalid credentials'))
-        
-        attrs['customer'] = customer
-        return attrs
-
-
-class UserLoginSerializer(serializers.Serializer):
-    email = serializers.EmailField()
-    password = serializers.CharField(write_only=True)
-
-    def validate(self, attrs):
-        email = attrs.get('email')
-        password = attrs.get('password')
-
-        if not email or not password:
-            raise serializers.ValidationError(_('Must include email and password'))
-        
-        try:
-            user = User.objects.get(email=email)
-        except User.DoesNotExist:
-            raise serializers.ValidationError(_('Invalid credentials'))
-        
-        if user.status == 'INACTIVE':
-            raise serializers.ValidationError(_('Staff account is inactive'))
-        
-        if not check_password(password, user.password):
+        account = resolve_login(attrs['email'], attrs['password'])
+        if account is None:
             raise serializers.ValidationError(_('Invalid credentials'))
-
-        attrs['user'] = user
+        attrs['account'] = account
         return attrs
 
 
@@ -260,16 +225,31 @@ class ProductSerializer(serializers.ModelSerializer):
     category_ids = serializers.ListField(
         child=serializers.IntegerField(), write_only=True, required=False
     )
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
         fields = [
             'id', 'name', 'categories', 'category_ids', 'product_code',
             'cost', 'price', 'quantity', 'description', 'image',  # ✅ Added image
-            'created_at', 'updated_at', 'is_active'
+            'image_variants', 'created_at', 'updated_at', 'is_active'
         ]
         read_only_fields = ['id', 'product_code', 'created_at', 'updated_at']
 
+    def get_image_variants(self, obj):
+        """{size: {format: url}} once process_product_images has run, else None"""
+        variants = obj.image_variants
+        if not variants or 'error' in variants:
+            return None
+        request = self.context.get('request')
+        urls = {}
+        for size, formats in variants.items():
+            urls[size] = {}
+            for fmt, name in formats.items():
+                url = default_storage.url(name)
+                urls[size][fmt] = request.build_absolute_uri(url) if request else url
+        return urls
+
     def create(self, validated_data):
         category_ids = validated_data.pop('category_ids', [])
         product = Product.objects.create(**validated_data)
@@ -287,6 +267,25 @@ class ProductSerializer(serializers.ModelSerializer):
         return instance
 
 
+class ProductImportSerializer(serializers.Serializer):
+    """One row of a product import file (see product_io)
+
+    Optional fields left out of a row keep their current value when the
+    product_code already exists, and take the model default otherwise.
+    ``categories`` replaces the product's categories, an empty list clears
+    them. An empty CSV cell counts as left out, so a CSV import never clears
+    a description; send ``"description": null`` (or "") in JSONL for that.
+    """
+    product_code = serializers.CharField(max_length=20, required=False)
+    name = serializers.CharField(max_length=200)
+    categories = serializers.ListField(child=serializers.CharField(max_length=100), required=False)
+    cost = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+    quantity = serializers.IntegerField(min_value=0, required=False)
+    description = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    is_active = serializers.BooleanField(required=False)
+
+
 # ============================================================================
 # ROOM SERIALIZERS
 # ============================================================================
@@ -304,6 +303,14 @@ class RoomSerializer(serializers.ModelSerializer):
         ]
 
 
+class RoomAvailabilitySerializer(RoomSerializer):
+    """Room plus whether it is free for the searched dates"""
+    available = serializers.BooleanField(read_only=True)
+
+    class Meta(RoomSerializer.Meta):
+        fields = RoomSerializer.Meta.fields + ['available']
+
+
 # ============================================================================
 # CART AND ORDER SERIALIZERS
 # ============================================================================
@@ -328,6 +335,47 @@ class CartItemSerializer(serializers.ModelSerializer):
         return value
 
 
+class CartLineListSerializer(serializers.ListSerializer):
+    """List of {product_id, quantity}; each product may appear once"""
+
+    def validate(self, attrs):
+        ids = [line['product_id'] for line in attrs]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError('Each product may only appear once.')
+        return attrs
+
+
+class CartLineSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=0)
+
+    class Meta:
+        list_serializer_class = CartLineListSerializer
+
+
+class BulkCartSerializer(serializers.Serializer):
+    """Many cart lines in one call
+
+    increment: add to the current quantities (merging an offline cart)
+    set: overwrite the listed lines, 0 removes a line
+    replace: like set, and drop every line not listed
+    """
+    MODE_CHOICES = [
+        ('increment', 'Increment'),
+        ('set', 'Set'),
+        ('replace', 'Replace'),
+    ]
+
+    user_id = serializers.IntegerField()
+    mode = serializers.ChoiceField(choices=MODE_CHOICES, default='increment')
+    items = CartLineSerializer(many=True, max_length=500)
+
+    def validate(self, attrs):
+        if attrs['mode'] == 'increment' and any(line['quantity'] == 0 for line in attrs['items']):
+            raise serializers.ValidationError({'items': 'quantity must be > 0 when incrementing.'})
+        return attrs
+
+
 class CartSerializer(serializers.ModelSerializer):
     """Serializer for shopping cart"""
     cart_items = CartItemSerializer(many=True, read_only=True)
@@ -364,6 +412,28 @@ class OrderSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'order_number', 'customer', 'created_at', 'updated_at']
 
+class ProductSummarySerializer(serializers.ModelSerializer):
+    """Just enough product data to label an order line"""
+    class Meta:
+        model = Product
+        fields = ['id', 'name', 'product_code']
+
+
+class OrderItemSummarySerializer(serializers.ModelSerializer):
+    """Order line without the full nested product payload"""
+    product = ProductSummarySerializer(read_only=True)
+    subtotal = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = OrderItem
+        fields = ['id', 'product', 'quantity', 'price', 'subtotal', 'created_at']
+
+
+class OrderListSerializer(OrderSerializer):
+    """Lightweight variant of OrderSerializer for admin lists"""
+    order_items = OrderItemSummarySerializer(many=True, read_only=True)
+
+
 class OrderDetailSerializer(serializers.ModelSerializer):
     order_items = OrderItemSerializer(many=True, read_only=True)
     items_count = serializers.SerializerMethodField()
@@ -411,6 +481,24 @@ class CreateOrderSerializer(serializers.Serializer):
         return attrs
 
 
+class BulkOrderStatusSerializer(serializers.ListSerializer):
+    """List of {id, status}; each order may appear once"""
+
+    def validate(self, attrs):
+        ids = [change['id'] for change in attrs]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError('Each order may only appear once.')
+        return attrs
+
+
+class OrderStatusChangeSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+
+    class Meta:
+        list_serializer_class = BulkOrderStatusSerializer
+
+
 # ============================================================================
 # CHAT AND MESSAGING SERIALIZERS
 # ============================================================================
@@ -446,7 +534,8 @@ class ChatBotSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at', 'last_message']
 
     def get_last_message(self, obj):
-        msg = obj.messages.order_by('-timestamp').first()
+        # Denormalized on ChatBot; views select_related('last_message')
+        msg = obj.last_message
         if not msg:
             return None
         return ChatMessageSerializer(msg).data
@@ -470,8 +559,8 @@ class ChatBotDetailSerializer(ChatBotSerializer):
 class FeedbackSerializer(serializers.ModelSerializer):
     class Meta:
         model = Feedback
-        fields = ['id', 'full_name', 'message']  # id is read-only PK
-        read_only_fields = ['id']
+        fields = ['id', 'full_name', 'message', 'created_at']  # id is read-only PK
+        read_only_fields = ['id', 'created_at']
 
 # ============================================================================
 # AI INSIGHTS SERIALIZERS
@@ -549,14 +638,7 @@ class CreateRoomReservationSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(f"Guests exceed room capacity ({room.capacity}).")
 
         # Prevent overlapping reservations (ignore canceled/checked_out)
-        overlap = RoomReservation.objects.filter(
-            room=room,
-            status__in=['pending', 'confirmed', 'checked_in'],
-            check_in__lt=check_out,
-            check_out__gt=check_in,
-        ).exists()
-
-        if overlap:
+        if not is_room_available(room, check_in, check_out):
             raise serializers.ValidationError("This room is already reserved in the selected date range.")
 
         return attrs
@@ -566,14 +648,20 @@ class CreateRoomReservationSerializer(serializers.ModelSerializer):
         check_in: date = validated_data['check_in']
         check_out: date = validated_data['check_out']
 
-        nights = (check_out - check_in).days
-        total = room.price_per_night * nights
+        with transaction.atomic():
+            # Serialize concurrent bookings of the same room, then re-check under the lock
+            room = Room.objects.select_for_update().get(pk=room.pk)
+            if not is_room_available(room, check_in, check_out):
+                raise serializers.ValidationError("This room is already reserved in the selected date range.")
 
-        reservation = RoomReservation.objects.create(
-            **validated_data,
-            total_amount=total,
-            status='confirmed',
-        )
+            nights = (check_out - check_in).days
+            total = room.price_per_night * nights
+
+            reservation = RoomReservation.objects.create(
+                **validated_data,
+                total_amount=total,
+                status='confirmed',
+            )
         return reservation
     
 class UpdateRoomReservationSerializer(serializers.ModelSerializer):
@@ -586,28 +674,7 @@ class UpdateRoomReservationSerializer(serializers.ModelSerializer):
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         instance.save()
-
-        # Update room reserved status based on new status and dates
-        today = timezone.localdate()
-        room = instance.room
-        
-        if instance.status in ['checked_in']:
-            # Mark room as reserved when checked in
-            if not room.reserved:
-                room.reserved = True
-                room.save(update_fields=['reserved'])
-        elif instance.status in ['checked_out', 'canceled']:
-            # Check if room should be unreserved
-            has_active_reservations = RoomReservation.objects.filter(
-                room=room,
-                status__in=['pending', 'confirmed', 'checked_in'],
-                check_in__lte=today,
-                check_out__gt=today
-            ).exclude(id=instance.id).exists()
-            
-            if not has_active_reservations and room.reserved:
-                room.reserved = False
-                room.save(update_fields=['reserved'])
+        reservation_changed(instance)
 
         return instance
     
@@ -0,0 +1,211 @@
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .authentication import invalidate_principal_tokens, invalidate_token
+from .catalog import invalidate_catalog
+from .autocomplete import indexes as autocomplete_indexes
+from .images import delete_variants
+from .search import product_index
+from .models import (
+    Cart, ChatBot, ChatMessage, Customer, Feedback, Order, Product, ProductCategory, Room, User,
+    UserToken,
+)
+from .realtime import chat_hub
+from .stats import invalidate_dashboard_stats
+
+
+# ============================================================================
+# CHAT
+# ============================================================================
+
+@receiver(post_save, sender=ChatMessage)
+def publish_chat_message(sender, instance, created, **kwargs):
+    """Push newly created messages to stream subscribers once committed"""
+    if created:
+        transaction.on_commit(lambda: chat_hub.publish_message(instance))
+
+
+@receiver(post_save, sender=ChatMessage)
+def update_last_message(sender, instance, created, **kwargs):
+    """Keep ChatBot.last_message pointing at the newest message"""
+    if created:
+        # Conditional so a slower concurrent insert can't overwrite a newer message
+        updated = ChatBot.objects.filter(
+            Q(last_message__isnull=True) | Q(last_message_id__lt=instance.id),
+            pk=instance.chat_session_id,
+        ).update(last_message=instance)
+        # active_chat_sessions counts by last_message's sender; .update() sends no signal
+        if updated:
+            invalidate_dashboard_stats()
+
+
+# ============================================================================
+# CART TOTALS
+# ============================================================================
+
+@receiver(post_save, sender=Product)
+def refresh_cart_totals_on_price_change(sender, instance, created, update_fields=None, **kwargs):
+    """Stored cart totals depend on product price"""
+    if created or (update_fields is not None and 'price' not in update_fields):
+        return
+    Cart.refresh_totals_for(Cart.objects.filter(cart_items__product=instance))
+
+
+@receiver(pre_delete, sender=Product)
+def remember_carts_of_deleted_product(sender, instance, **kwargs):
+    instance._affected_cart_ids = list(
+        Cart.objects.filter(cart_items__product=instance).values_list('id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Product)
+def refresh_cart_totals_on_product_delete(sender, instance, **kwargs):
+    cart_ids = getattr(instance, '_affected_cart_ids', None)
+    if cart_ids:
+        Cart.refresh_totals_for(Cart.objects.filter(id__in=cart_ids))
+
+
+# ============================================================================
+# CATALOG CACHE
+# ============================================================================
+
+def _invalidate_catalog(sender, **kwargs):
+    invalidate_catalog()
+
+
+for _model in (Product, ProductCategory):
+    post_save.connect(_invalidate_catalog, sender=_model, dispatch_uid=f'catalog-save-{_model.__name__}')
+    post_delete.connect(_invalidate_catalog, sender=_model, dispatch_uid=f'catalog-delete-{_model.__name__}')
+m2m_changed.connect(_invalidate_catalog, sender=Product.categories.through, dispatch_uid='catalog-categories')
+
+
+# ============================================================================
+# PRODUCT IMAGE VARIANTS
+# ============================================================================
+
+@receiver(pre_save, sender=Product)
+def reset_image_variants(sender, instance, update_fields=None, **kwargs):
+    """A new or removed image queues the product for process_product_images again"""
+    if instance.pk is None or (update_fields is not None and 'image' not in update_fields):
+        return
+    previous = Product.objects.filter(pk=instance.pk).values_list('image', 'image_variants').first()
+    if previous is None or previous[0] == (instance.image.name or ''):
+        return
+    instance.image_variants = {}
+    old_variants = previous[1]
+    if old_variants:
+        transaction.on_commit(lambda: delete_variants(old_variants))
+
+
+# ============================================================================
+# PRODUCT SEARCH INDEX
+# ============================================================================
+
+def _refresh_search_index(product_ids):
+    product_ids = list(product_ids)
+    transaction.on_commit(lambda: product_index.refresh_products(product_ids))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def reindex_product(sender, instance, **kwargs):
+    _refresh_search_index([instance.pk])
+
+
+@receiver(m2m_changed, sender=Product.categories.through)
+def reindex_product_categories(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        _refresh_search_index([instance.pk])
+    elif pk_set:
+        _refresh_search_index(pk_set)
+    else:
+        # Category cleared of all products: the ids are gone already
+        transaction.on_commit(product_index.invalidate)
+
+
+@receiver(post_save, sender=ProductCategory)
+def reindex_category_products(sender, instance, created, **kwargs):
+    """Category names are indexed with their products"""
+    if not created:
+        _refresh_search_index(instance.products.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=ProductCategory)
+def reindex_after_category_delete(sender, instance, **kwargs):
+    transaction.on_commit(product_index.invalidate)
+
+
+# ============================================================================
+# AUTOCOMPLETE
+# ============================================================================
+
+def _refresh_autocomplete(sender, instance, **kwargs):
+    index = autocomplete_indexes[sender._meta.model_name]
+    pk = instance.pk
+    transaction.on_commit(lambda: index.refresh([pk]))
+
+
+for _model in (Product, Room, Customer):
+    post_save.connect(_refresh_autocomplete, sender=_model, dispatch_uid=f'autocomplete-save-{_model.__name__}')
+    post_delete.connect(_refresh_autocomplete, sender=_model, dispatch_uid=f'autocomplete-delete-{_model.__name__}')
+
+
+# ============================================================================
+# AUTH TOKEN CACHE
+# ============================================================================
+
+@receiver(post_delete, sender=UserToken)
+def drop_cached_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def drop_cached_user_tokens(sender, instance, created, **kwargs):
+    """Cached tokens hold a copy of their owner; refresh it after edits"""
+    if not created:
+        invalidate_principal_tokens(user=instance)
+
+
+@receiver(post_save, sender=Customer)
+def drop_cached_customer_tokens(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_principal_tokens(customer=instance)
+
+
+@receiver(pre_delete, sender=User)
+def drop_tokens_of_deleted_user(sender, instance, **kwargs):
+    # The FK is SET_NULL, so the token rows would otherwise survive owner-less
+    UserToken.objects.filter(user=instance).delete()
+
+
+@receiver(pre_delete, sender=Customer)
+def drop_tokens_of_deleted_customer(sender, instance, **kwargs):
+    UserToken.objects.filter(customer=instance).delete()
+
+
+# ============================================================================
+# DASHBOARD STATS
+# ============================================================================
+
+def _invalidate_on_create(sender, created, **kwargs):
+    if created:
+        invalidate_dashboard_stats()
+
+
+def _invalidate_always(sender, **kwargs):
+    invalidate_dashboard_stats()
+
+
+# Counted by row existence: only inserts and deletes change them
+for _model in (Customer, Order, Feedback, ChatBot):
+    post_save.connect(_invalidate_on_create, sender=_model, dispatch_uid=f'dashboard-create-{_model.__name__}')
+    post_delete.connect(_invalidate_always, sender=_model, dispatch_uid=f'dashboard-delete-{_model.__name__}')
+
+# Counted by is_active, which any edit may flip
+for _model in (Product, Room):
+    post_save.connect(_invalidate_always, sender=_model, dispatch_uid=f'dashboard-save-{_model.__name__}')
+    post_delete.connect(_invalidate_always, sender=_model, dispatch_uid=f'dashboard-delete-{_model.__name__}')
@@ -0,0 +1,38 @@
+"""
+Dashboard statistics.
+
+The counts are rebuilt at most every ``DASHBOARD_STATS_TTL`` seconds and kept
+in the cache, so the dashboard endpoint is a single cache read. Signals drop
+the cached copy whenever a row that affects a count is created, deleted or
+(for products/rooms) toggled, so changes show up on the next refresh.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import ChatBot, Customer, Feedback, Order, Product, Room
+
+
+DASHBOARD_CACHE_KEY = 'dashboard:stats'
+
+
+def compute_dashboard_stats():
+    today = timezone.localdate()
+    return {
+        'total_customers': Customer.objects.count(),
+        'total_orders': Order.objects.count(),
+        'total_products': Product.objects.filter(is_active=True).count(),
+        'total_rooms': Room.objects.filter(is_active=True).count(),
+        # Sessions where the customer spoke last, i.e. waiting on staff
+        'active_chat_sessions': ChatBot.objects.filter(last_message__sender='C').count(),
+        'recent_feedback_count': Feedback.objects.filter(created_at__date=today).count(),
+        'generated_at': timezone.now().isoformat(),
+    }
+
+
+def get_dashboard_stats():
+    return cache.get_or_set(DASHBOARD_CACHE_KEY, compute_dashboard_stats, settings.DASHBOARD_STATS_TTL)
+
+
+def invalidate_dashboard_stats():
+    cache.delete(DASHBOARD_CACHE_KEY)
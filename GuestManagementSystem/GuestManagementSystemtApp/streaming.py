@@ -0,0 +1,48 @@
+"""
+Streamed JSON exports for admin lists.
+
+Rows are read with ``QuerySet.iterator(chunk_size=...)`` and rendered one
+chunk at a time, so peak memory is bounded by the chunk size rather than by
+the size of the table.
+"""
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import JSONRenderer
+
+
+def stream_json_array(queryset, serializer_class, chunk_size=500, context=None):
+    """Yield a JSON array of serialized rows, ``chunk_size`` rows per piece"""
+    renderer = JSONRenderer()
+    yield '['
+    first = True
+    chunk = []
+
+    def render(rows):
+        # Render the chunk as an array and drop the surrounding brackets
+        return renderer.render(serializer_class(rows, many=True, context=context).data).decode()[1:-1]
+
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(obj)
+        if len(chunk) >= chunk_size:
+            yield ('' if first else ',') + render(chunk)
+            first = False
+            chunk = []
+    if chunk:
+        yield ('' if first else ',') + render(chunk)
+    yield ']'
+
+
+class StreamingListMixin:
+    """Add ?stream=true to a ListAPIView to get the full filtered list as a streamed JSON array"""
+    stream_chunk_size = 500
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('stream') != 'true':
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        return StreamingHttpResponse(
+            stream_json_array(
+                queryset, self.get_serializer_class(), self.stream_chunk_size,
+                context=self.get_serializer_context(),
+            ),
+            content_type='application/json',
+        )
@@ -1,3 +1,1376 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.hashers import check_password
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail import get_connection
+from django.core.management import CommandError, call_command
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from .analytics import occupancy_report, revenue_report
+from .authentication import issue_token, local_tokens, resolve_login, resolve_token
+from .autocomplete import autocomplete
+from .availability import annotate_availability, is_room_available
+from .images import VARIANT_SIZES, pending_products, process_batch, render_variants, variant_name
+from .media import IMMUTABLE_MAX_AGE, MUTABLE_MAX_AGE
+from .models import (
+    Cart, CartItem, ChatBot, ChatMessage, Customer, DailySales, EmailOutbox, Feedback, Order, OrderItem, Product,
+    ProductCategory, Room, RoomReservation, User, UserToken,
+)
+from .occupancy import reconcile_all, reservation_changed
+from .outbox import MAX_ATTEMPTS, RETRY_BACKOFF, build_email, drain_outbox, enqueue_email, enqueue_emails
+from .realtime import chat_event_stream, chat_hub
+from .rollups import build_rollups
+from .search import search_product_ids
+from .serializers import RoomReservationSerializer
+from .stats import get_dashboard_stats, invalidate_dashboard_stats
+from .streaming import stream_json_array
+from .views import AllReservationView, decrement_stock
+
+
+def make_customer(username='guest', **kwargs):
+    return Customer.objects.create_user(
+        username=username, email=f'{username}@example.com', password='secret-pass', **kwargs
+    )
+
+
+def make_product(name='Tea', price='10.00', quantity=10, **kwargs):
+    return Product.objects.create(name=name, cost='1.00', price=price, quantity=quantity, **kwargs)
+
+
+# ============================================================================
+# CART TOTALS
+# ============================================================================
+
+class CartTotalsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.customer = make_customer()
+        self.tea = make_product('Tea', price='10.00')
+        self.cake = make_product('Cake', price='4.50')
+
+    def cart(self):
+        return Cart.objects.get(customer=self.customer)
+
+    def add(self, product, quantity):
+        return self.client.post(
+            '/api/cart/items/', {'user_id': self.customer.id, 'product_id': product.id, 'quantity': quantity},
+            format='json',
+        )
+
+    def test_adding_items_updates_stored_totals(self):
+        self.add(self.tea, 2)
+        self.add(self.cake, 1)
+        self.add(self.tea, 1)
+        cart = self.cart()
+        self.assertEqual(cart.total_amount, Decimal('34.50'))
+        self.assertEqual(cart.total_items, 4)
+
+    def test_editing_and_removing_a_line_updates_totals(self):
+        self.add(self.tea, 2)
+        self.add(self.cake, 2)
+        line = CartItem.objects.get(cart=self.cart(), product=self.tea)
+        self.client.force_authenticate(user=self.customer)
+
+        self.client.patch(f'/api/cart/items/{line.id}/', {'quantity': 5}, format='json')
+        self.assertEqual(self.cart().total_amount, Decimal('59.00'))
+
+        self.client.delete(f'/api/cart/items/{line.id}/')
+        cart = self.cart()
+        self.assertEqual(cart.total_amount, Decimal('9.00'))
+        self.assertEqual(cart.total_items, 2)
+
+    def test_price_change_refreshes_carts_holding_the_product(self):
+        self.add(self.tea, 2)
+        self.tea.price = Decimal('12.00')
+        self.tea.save()
+        self.assertEqual(self.cart().total_amount, Decimal('24.00'))
+
+    def test_deleting_a_product_drops_it_from_totals(self):
+        self.add(self.tea, 2)
+        self.add(self.cake, 2)
+        self.tea.delete()
+        cart = self.cart()
+        self.assertEqual(cart.total_amount, Decimal('9.00'))
+        self.assertEqual(cart.total_items, 2)
+
+    def test_cart_view_reports_stored_totals(self):
+        self.add(self.tea, 3)
+        response = self.client.get('/api/cart/', {'user_id': self.customer.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Decimal(str(response.data['total_amount'])), Decimal('30.00'))
+
+
+class BulkCartTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.customer = make_customer()
+        self.tea = make_product('Tea', price='10.00')
+        self.cake = make_product('Cake', price='5.00')
+        self.scone = make_product('Scone', price='3.00')
+        self.cart = Cart.objects.create(customer=self.customer)
+        CartItem.objects.create(cart=self.cart, product=self.tea, quantity=2)
+        CartItem.objects.create(cart=self.cart, product=self.scone, quantity=1)
+
+    def post(self, items, mode=None):
+        data = {'user_id': self.customer.id, 'items': items}
+        if mode:
+            data['mode'] = mode
+        return self.client.post('/api/cart/items/bulk/', data, format='json')
+
+    def lines(self):
+        return dict(CartItem.objects.filter(cart=self.cart).values_list('product__name', 'quantity'))
+
+    def test_increment_merges_in_one_upsert(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post([
+                {'product_id': self.tea.id, 'quantity': 3}, {'product_id': self.cake.id, 'quantity': 1},
+            ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.lines(), {'Tea': 5, 'Cake': 1, 'Scone': 1})
+        self.assertEqual((response.data['total_amount'], response.data['total_items']), ('58.00', 7))
+        inserts = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 1)
+
+    def test_set_and_replace(self):
+        self.post([{'product_id': self.tea.id, 'quantity': 1}, {'product_id': self.scone.id, 'quantity': 0}], 'set')
+        self.assertEqual(self.lines(), {'Tea': 1})
+
+        response = self.post([{'product_id': self.cake.id, 'quantity': 4}], 'replace')
+        self.assertEqual(self.lines(), {'Cake': 4})
+        self.assertEqual(response.data['total_amount'], '20.00')
+
+    def test_unknown_or_inactive_products_reject_the_batch(self):
+        Product.objects.filter(id=self.cake.id).update(is_active=False)
+        response = self.post([
+            {'product_id': self.tea.id, 'quantity': 1}, {'product_id': self.cake.id, 'quantity': 1},
+            {'product_id': 999, 'quantity': 1},
+        ])
+        self.assertEqual((response.status_code, response.data['product_ids']), (400, [self.cake.id, 999]))
+        self.assertEqual(self.lines(), {'Tea': 2, 'Scone': 1})
+
+    def test_invalid_lines_are_rejected(self):
+        self.assertEqual(self.post([{'product_id': self.tea.id, 'quantity': 0}]).status_code, 400)
+        repeated = [{'product_id': self.tea.id, 'quantity': 1}, {'product_id': self.tea.id, 'quantity': 2}]
+        self.assertEqual(self.post(repeated, 'set').status_code, 400)
+        self.assertEqual(self.lines(), {'Tea': 2, 'Scone': 1})
+
+
+# ============================================================================
+# CHECKOUT STOCK
+# ============================================================================
+
+class CheckoutStockTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.customer = make_customer()
+        self.cart = Cart.objects.create(customer=self.customer)
+        self.tea = make_product('Tea', price='10.00', quantity=5)
+        self.cake = make_product('Cake', price='4.00', quantity=1)
+
+    def fill_cart(self, **lines):
+        for name, quantity in lines.items():
+            CartItem.objects.create(cart=self.cart, product=getattr(self, name), quantity=quantity)
+        self.cart.refresh_totals()
+
+    def checkout(self):
+        return self.client.post('/api/orders/', {'user_id': self.customer.id}, format='json')
+
+    def test_checkout_takes_stock_and_clears_cart(self):
+        self.fill_cart(tea=3, cake=1)
+        response = self.checkout()
+        self.assertEqual(response.status_code, 201)
+        self.tea.refresh_from_db()
+        self.cake.refresh_from_db()
+        self.assertEqual((self.tea.quantity, self.cake.quantity), (2, 0))
+        self.assertEqual(Decimal(str(response.data['total_amount'])), Decimal('34.00'))
+        self.cart.refresh_from_db()
+        self.assertEqual((self.cart.total_items, self.cart.cart_items.count()), (0, 0))
+
+    def test_oversold_line_fails_whole_checkout(self):
+        self.fill_cart(tea=2, cake=2)
+        response = self.checkout()
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(self.cake.id), response.data['stock'])
+        self.tea.refresh_from_db()
+        self.assertEqual(self.tea.quantity, 5)
+        self.assertEqual(Order.objects.count(), 0)
+        self.assertEqual(self.cart.cart_items.count(), 2)
+
+    def test_inactive_product_is_rejected(self):
+        self.fill_cart(tea=1)
+        Product.objects.filter(pk=self.tea.pk).update(is_active=False)
+        response = self.checkout()
+        self.assertEqual(response.status_code, 400)
+        self.tea.refresh_from_db()
+        self.assertEqual(self.tea.quantity, 5)
+
+    def test_decrement_stock_returns_reduced_products(self):
+        with transaction.atomic():
+            products = decrement_stock({self.tea.id: 4, self.cake.id: 1})
+        self.assertEqual(products[self.tea.id].quantity, 1)
+        self.assertEqual(
+            dict(Product.objects.values_list('id', 'quantity')), {self.tea.id: 1, self.cake.id: 0}
+        )
+
+
+# ============================================================================
+# PAGINATION
+# ============================================================================
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_page_param_falls_back_to_page_numbers(self):
+        # The admin orders screen sends ?page=&page_size=&ordering=
+        customer = make_customer()
+        orders = [Order.objects.create(customer=customer, total_amount='1.00') for _ in range(12)]
+        response = self.client.get('/api/admin/orders/', {'page': 1, 'page_size': 10, 'ordering': '-created_at'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 12)
+        self.assertEqual(
+            [order['id'] for order in response.data['results']], [order.id for order in orders[::-1][:10]]
+        )
+
+        response = self.client.get('/api/admin/orders/', {'page': 2, 'page_size': 10})
+        self.assertEqual([order['id'] for order in response.data['results']], [orders[1].id, orders[0].id])
+
+        Feedback.objects.create(full_name='A', message='Hi')
+        response = self.client.get('/api/feedback/', {'page': 1, 'page_size': 10, 'ordering': '-created_at'})
+        self.assertEqual((response.status_code, response.data['count']), (200, 1))
+
+    def test_client_ordering_pages_through_ties_once(self):
+        customer = make_customer()
+        orders = [Order.objects.create(customer=customer, total_amount='1.00') for _ in range(5)]
+        # Every order on the same created_at: only the id tiebreaker keeps pages apart
+        Order.objects.update(created_at=orders[0].created_at)
+
+        seen, url, params = [], '/api/admin/orders/', {'ordering': 'created_at', 'page_size': 2}
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(order['id'] for order in response.data['results'])
+            url, params = response.data['next'], None
+        self.assertEqual(seen, sorted(order.id for order in orders))
+
+    def test_status_ordering_breaks_ties_on_id(self):
+        customer = make_customer()
+        shipped = Order.objects.create(customer=customer, total_amount='1.00', status='S')
+        confirmed = Order.objects.create(customer=customer, total_amount='1.00', status='C')
+        shipped_later = Order.objects.create(customer=customer, total_amount='1.00', status='S')
+
+        response = self.client.get('/api/admin/orders/', {'ordering': 'status', 'page_size': 2})
+        self.assertEqual([order['id'] for order in response.data['results']], [confirmed.id, shipped.id])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([order['id'] for order in response.data['results']], [shipped_later.id])
+
+
+# ============================================================================
+# ADMIN ORDER LIST
+# ============================================================================
+
+class AllOrdersQueryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        products = [make_product(f'Item {i}') for i in range(3)]
+        products[0].categories.set([ProductCategory.objects.create(name='Drinks')])
+        for number in range(4):
+            order = Order.objects.create(
+                customer=make_customer(f'guest{number}', first_name=f'Anna{number}'), total_amount='30.00'
+            )
+            for product in products:
+                OrderItem.objects.create(order=order, product=product, quantity=1, price=product.price)
+
+    def test_list_runs_in_constant_queries(self):
+        # Orders joined to customers, then every item joined to its product
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/admin/orders/')
+        self.assertEqual(len(response.data), 4)
+        self.assertEqual(len(response.data[0]['order_items']), 3)
+
+    def test_search_matches_a_substring_of_a_customer_name(self):
+        response = self.client.get('/api/admin/orders/', {'search': 'nna2'})
+        self.assertEqual([order['customer']['first_name'] for order in response.data], ['Anna2'])
+
+
+# ============================================================================
+# DASHBOARD STATS
+# ============================================================================
+
+class DashboardStatsTests(TestCase):
+    def setUp(self):
+        invalidate_dashboard_stats()
+
+    def test_new_chat_message_refreshes_active_sessions(self):
+        session = ChatBot.objects.create(session_id='s1', customer=make_customer())
+        ChatMessage.objects.create(chat_session=session, sender='C', message='Hello?')
+        self.assertEqual(get_dashboard_stats()['active_chat_sessions'], 1)
+
+        # Staff replied: the session no longer waits on anyone
+        ChatMessage.objects.create(chat_session=session, sender='A', message='Hi!')
+        self.assertEqual(get_dashboard_stats()['active_chat_sessions'], 0)
+
+
+# ============================================================================
+# TOKEN AUTHENTICATION
+# ============================================================================
+
+class TokenCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_tokens.clear()
+        self.client = APIClient()
+        self.customer = make_customer()
+        self.token = issue_token(customer=self.customer)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_cached_token_resolves_without_queries(self):
+        self.assertEqual(resolve_token(self.token.key), self.customer)
+        with self.assertNumQueries(0):
+            self.assertEqual(resolve_token(self.token.key), self.customer)
+
+    def test_logout_revokes_cached_token(self):
+        resolve_token(self.token.key)
+        self.assertEqual(self.client.post('/api/auth/logout/').status_code, 200)
+        self.assertIsNone(resolve_token(self.token.key))
+        self.assertEqual(self.client.post('/api/auth/logout/').status_code, 401)
+
+    def test_deleting_token_drops_cached_entry(self):
+        resolve_token(self.token.key)
+        UserToken.objects.filter(pk=self.token.pk).delete()
+        self.assertIsNone(resolve_token(self.token.key))
+
+    def test_deactivated_customer_is_rejected_despite_cache(self):
+        resolve_token(self.token.key)
+        self.customer.is_active = False
+        self.customer.save()
+        self.assertEqual(self.client.post('/api/auth/logout/').status_code, 401)
+
+    def test_expired_token_is_rejected_and_replaced_on_login(self):
+        UserToken.objects.filter(pk=self.token.pk).update(
+            created=timezone.now() - timedelta(seconds=settings.AUTH_TOKEN_TTL + 1)
+        )
+        self.assertIsNone(resolve_token(self.token.key))
+        self.assertNotEqual(issue_token(customer=self.customer).key, self.token.key)
+
+
+# ============================================================================
+# LOGIN
+# ============================================================================
+
+class ResolveLoginTests(TestCase):
+    def setUp(self):
+        self.customer = make_customer('guest')
+        self.staff = User(name='Staff', email='staff@example.com', phone='1')
+        self.staff.set_password('staff-pass')
+        self.staff.save()
+
+    def resolve(self, email, password):
+        with mock.patch('GuestManagementSystemtApp.authentication.check_password', wraps=check_password) as hashed:
+            account = resolve_login(email, password)
+        return account, hashed.call_count
+
+    def test_each_account_type_logs_in(self):
+        with self.assertNumQueries(2):
+            self.assertEqual(self.resolve('guest@example.com', 'secret-pass'), (self.customer, 1))
+        self.assertEqual(self.resolve('staff@example.com', 'staff-pass'), (self.staff, 1))
+
+    def test_wrong_or_unknown_credentials_cost_one_hash(self):
+        self.assertEqual(self.resolve('guest@example.com', 'nope'), (None, 1))
+        with self.assertNumQueries(1):
+            self.assertEqual(self.resolve('nobody@example.com', 'nope'), (None, 1))
+
+    def test_shared_email_checks_staff_account_only(self):
+        Customer.objects.filter(pk=make_customer('shared').pk).update(email='staff@example.com')
+        self.assertEqual(self.resolve('staff@example.com', 'secret-pass'), (None, 1))
+        self.assertEqual(self.resolve('staff@example.com', 'staff-pass'), (self.staff, 1))
+
+    def test_inactive_customer_is_refused(self):
+        Customer.objects.filter(pk=self.customer.pk).update(is_active=False)
+        self.assertEqual(self.resolve('guest@example.com', 'secret-pass'), (None, 1))
+
+
+# ============================================================================
+# PRODUCT IMPORT / EXPORT
+# ============================================================================
+
+class ProductImportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.staff = User.objects.create(name='Staff', email='staff@example.com', phone='1')
+        self.client.force_authenticate(user=self.staff)
+        self.drinks = ProductCategory.objects.create(name='Drinks')
+        self.food = ProductCategory.objects.create(name='Food')
+
+    def import_csv(self, body, query=''):
+        return self.client.post(f'/api/products/import/{query}', body, content_type='text/csv')
+
+    def test_price_import_refreshes_cart_totals(self):
+        product = make_product('Tea', price='10.00', product_code='TEA1')
+        cart = Cart.objects.create(customer=make_customer())
+        CartItem.objects.create(cart=cart, product=product, quantity=2)
+        cart.refresh_totals()
+
+        response = self.import_csv('product_code,name,cost,price\nTEA1,Tea,1.00,99.00\n')
+        self.assertEqual(response.status_code, 200)
+        cart.refresh_from_db()
+        self.assertEqual(cart.total_amount, Decimal('198.00'))
+
+    def test_empty_categories_cell_clears_categories(self):
+        product = make_product('Tea', product_code='TEA1', description='Green')
+        product.categories.set([self.drinks, self.food])
+
+        response = self.import_csv('product_code,name,categories,cost,price,description\nTEA1,Tea,,1.00,2.00,\n')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(product.categories.exists())
+        # An empty description cell leaves the description alone
+        product.refresh_from_db()
+        self.assertEqual(product.description, 'Green')
+
+    def test_missing_categories_column_keeps_categories(self):
+        product = make_product('Tea', product_code='TEA1')
+        product.categories.set([self.drinks])
+        self.import_csv('product_code,name,cost,price\nTEA1,Tea,1.00,2.00\n')
+        self.assertEqual(list(product.categories.all()), [self.drinks])
+
+    def test_export_round_trips_through_import(self):
+        tea = make_product('Tea', price='2.50', product_code='TEA1', description='Green, loose')
+        tea.categories.set([self.drinks, self.food])
+        make_product('Cake', price='4.00', quantity=0, is_active=False)
+
+        for file_format, content_type in (('csv', 'text/csv'), ('jsonl', 'application/x-ndjson')):
+            response = self.client.get('/api/products/export/', {'file_format': file_format})
+            self.assertEqual(response['Content-Type'], content_type)
+            exported = b''.join(response.streaming_content)
+
+            response = self.client.post('/api/products/import/', exported, content_type=content_type)
+            self.assertEqual(response.data, {'created': 0, 'updated': 2, 'errors': []})
+            again = b''.join(self.client.get('/api/products/export/', {'file_format': file_format}).streaming_content)
+            self.assertEqual(again, exported)
+
+    def test_new_rows_get_codes_and_categories(self):
+        self.assertEqual(search_product_ids('scone'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.import_csv('name,categories,cost,price,quantity\nScone,Food|Drinks,1.00,3.00,4\n')
+        self.assertEqual(response.data['created'], 1)
+        scone = Product.objects.get(name='Scone')
+        self.assertTrue(scone.product_code.startswith('PRD'))
+        self.assertEqual(scone.quantity, 4)
+        self.assertEqual(set(scone.categories.all()), {self.drinks, self.food})
+        # bulk_create sends no signals; the import has the already built index rebuilt itself
+        self.assertEqual(search_product_ids('scone'), [scone.id])
+
+    def test_invalid_row_rolls_back_whole_file(self):
+        make_product('Tea', price='10.00', product_code='TEA1')
+        body = (
+            'product_code,name,categories,cost,price\n'
+            'TEA1,Tea,,1.00,12.00\n'
+            ',Scone,Pastry,1.00,3.00\n'
+            ',Cake,,abc,3.00\n'
+        )
+        response = self.import_csv(body)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['line'] for error in response.data['errors']], [3, 4])
+        self.assertEqual(Product.objects.count(), 1)
+        self.assertEqual(Product.objects.get().price, Decimal('10.00'))
+
+    def test_dry_run_counts_without_writing(self):
+        response = self.import_csv('name,cost,price\nScone,1.00,3.00\n', '?dry_run=true')
+        self.assertEqual(response.data, {'created': 1, 'updated': 0, 'errors': []})
+        self.assertFalse(Product.objects.exists())
+
+    def test_import_and_export_are_staff_only(self):
+        self.client.force_authenticate(user=make_customer())
+        self.assertEqual(self.import_csv('name,cost,price\nScone,1.00,3.00\n').status_code, 403)
+        self.assertEqual(self.client.get('/api/products/export/').status_code, 403)
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.import_csv('name,cost,price\nScone,1.00,3.00\n').status_code, 403)
+        self.assertFalse(Product.objects.exists())
+
+
+# ============================================================================
+# EMAIL OUTBOX
+# ============================================================================
+
+class EmailOutboxTests(TestCase):
+    def test_enqueue_rolls_back_with_the_transaction(self):
+        try:
+            with transaction.atomic():
+                enqueue_email('Booked', 'See you soon', 'guest@example.com')
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertFalse(EmailOutbox.objects.exists())
+
+    def test_drain_sends_over_one_connection(self):
+        enqueue_emails([build_email(f'Order {n}', 'Thanks', f'guest{n}@example.com') for n in range(3)])
+
+        with mock.patch('GuestManagementSystemtApp.outbox.get_connection', wraps=get_connection) as connect:
+            self.assertEqual(drain_outbox(), (3, 0))
+        connect.assert_called_once()
+        self.assertEqual([message.to for message in mail.outbox], [[f'guest{n}@example.com'] for n in range(3)])
+        self.assertEqual(set(EmailOutbox.objects.values_list('status', 'attempts')), {('sent', 1)})
+
+    def test_failed_send_backs_off(self):
+        email = enqueue_email('Booked', 'See you soon', 'guest@example.com')
+        email.attempts = 1
+        email.save()
+
+        before = timezone.now()
+        with mock.patch('GuestManagementSystemtApp.outbox.EmailMessage.send', side_effect=OSError('refused')):
+            self.assertEqual(drain_outbox(), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts, email.last_error), ('pending', 2, 'refused'))
+        # Second failure waits twice the base backoff
+        self.assertGreaterEqual(email.next_attempt_at, before + timedelta(seconds=2 * RETRY_BACKOFF))
+        self.assertEqual(mail.outbox, [])
+
+    def test_gives_up_after_max_attempts(self):
+        email = enqueue_email('Booked', 'See you soon', 'guest@example.com')
+        EmailOutbox.objects.filter(id=email.id).update(attempts=MAX_ATTEMPTS - 1)
+
+        with mock.patch('GuestManagementSystemtApp.outbox.EmailMessage.send', side_effect=OSError('refused')):
+            self.assertEqual(drain_outbox(), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('failed', MAX_ATTEMPTS))
+
+        # Even once it would be due, a failed row is never claimed again
+        EmailOutbox.objects.filter(id=email.id).update(next_attempt_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(drain_outbox(), (0, 0))
+        self.assertEqual(mail.outbox, [])
+
+
+# ============================================================================
+# ROOM AVAILABILITY
+# ============================================================================
+
+class RoomAvailabilityTests(TestCase):
+    def setUp(self):
+        self.room = Room.objects.create(room_code='101', price_per_night='80.00')
+        self.day = timezone.localdate()
+        # Booked for nights 10..13, checking out on day 14
+        self.reservation = self.book(10, 14)
+
+    def book(self, first, last, status='confirmed'):
+        return RoomReservation.objects.create(
+            room=self.room, customer=make_customer(f'guest{first}-{last}'),
+            check_in=self.day + timedelta(days=first), check_out=self.day + timedelta(days=last), status=status,
+        )
+
+    def available(self, first, last):
+        check_in, check_out = self.day + timedelta(days=first), self.day + timedelta(days=last)
+        single = is_room_available(self.room, check_in, check_out)
+        annotated = annotate_availability(Room.objects.all(), check_in, check_out).get().available
+        self.assertEqual(single, annotated)
+        return single
+
+    def test_back_to_back_stays_do_not_conflict(self):
+        self.assertTrue(self.available(7, 10))
+        self.assertTrue(self.available(14, 16))
+
+    def test_contained_and_containing_ranges_conflict(self):
+        self.assertFalse(self.available(11, 12))
+        self.assertFalse(self.available(8, 16))
+
+    def test_straddling_ranges_conflict(self):
+        self.assertFalse(self.available(8, 11))
+        self.assertFalse(self.available(13, 15))
+
+    def test_cancelled_and_finished_reservations_free_the_room(self):
+        self.book(20, 25, status='canceled')
+        self.book(30, 32, status='checked_out')
+        self.assertTrue(self.available(21, 23))
+        self.assertTrue(self.available(30, 31))
+
+    def test_excluding_the_reservation_itself(self):
+        self.assertTrue(is_room_available(
+            self.room, self.reservation.check_in, self.reservation.check_out, exclude=self.reservation
+        ))
+
+
+class RoomSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.day = timezone.localdate()
+        self.booked = Room.objects.create(room_code='101', price_per_night='80.00', capacity=2)
+        self.free = Room.objects.create(room_code='102', price_per_night='90.00', capacity=2)
+        self.single = Room.objects.create(room_code='103', price_per_night='50.00', capacity=1)
+        RoomReservation.objects.create(
+            room=self.booked, customer=make_customer(), status='confirmed',
+            check_in=self.on(10), check_out=self.on(14),
+        )
+
+    def on(self, offset):
+        return self.day + timedelta(days=offset)
+
+    def test_search_by_dates_and_guests(self):
+        params = {'check_in': self.on(11), 'check_out': self.on(12), 'guests': 2}
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/rooms/search/', params)
+        self.assertEqual([room['id'] for room in response.data], [self.free.id])
+
+        response = self.client.get('/api/rooms/search/', {**params, 'include_unavailable': 'true'})
+        self.assertEqual(
+            [(room['id'], room['available']) for room in response.data],
+            [(self.booked.id, False), (self.free.id, True)],
+        )
+
+    def test_dates_outside_the_stay_are_free(self):
+        response = self.client.get('/api/rooms/search/', {'check_in': self.on(14), 'check_out': self.on(16)})
+        self.assertEqual([room['id'] for room in response.data], [self.single.id, self.booked.id, self.free.id])
+
+    def test_invalid_dates_are_rejected(self):
+        self.assertEqual(self.client.get('/api/rooms/search/', {'check_in': self.on(3)}).status_code, 400)
+        response = self.client.get('/api/rooms/search/', {'check_in': self.on(3), 'check_out': self.on(3)})
+        self.assertEqual(response.status_code, 400)
+
+    def test_calendar_marks_booked_nights(self):
+        # Rooms, then every overlapping stay at once
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/rooms/calendar/', {'start': self.on(9), 'end': self.on(15)})
+        free = {room['id']: room['free'] for room in response.data['rooms']}
+        self.assertEqual(free[self.booked.id], [True, False, False, False, False, True])
+        self.assertEqual(free[self.free.id], [True] * 6)
+        self.assertEqual(len(response.data['dates']), 6)
+
+    def test_calendar_window_is_capped(self):
+        response = self.client.get('/api/rooms/calendar/', {'start': self.on(0), 'end': self.on(400)})
+        self.assertEqual(response.status_code, 400)
+
+
+class RoomOccupancyTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.today = timezone.localdate()
+        self.room = Room.objects.create(room_code='101', price_per_night='80.00')
+        self.customer = make_customer()
+
+    def book(self, first, last, status='confirmed'):
+        return RoomReservation.objects.create(
+            room=self.room, customer=self.customer, status=status,
+            check_in=self.today + timedelta(days=first), check_out=self.today + timedelta(days=last),
+        )
+
+    def test_status_changes_keep_the_flag_in_step(self):
+        reservation = self.book(0, 2)
+        reservation_changed(reservation)
+        self.room.refresh_from_db()
+        self.assertTrue(self.room.reserved)
+
+        response = self.client.patch(f'/api/reservations/{reservation.id}/status/', {'status': 'canceled'})
+        self.assertEqual(response.status_code, 200)
+        self.room.refresh_from_db()
+        self.assertFalse(self.room.reserved)
+
+    def test_future_stays_leave_the_flag_alone(self):
+        reservation = self.book(3, 5)
+        with self.assertNumQueries(0):
+            reservation_changed(reservation)
+
+    def test_reconcile_rolls_every_room_forward(self):
+        self.book(-2, 1)
+        self.book(1, 3)
+        stale = Room.objects.create(room_code='102', price_per_night='80.00', reserved=True)
+
+        self.assertEqual(reconcile_all(), 2)
+        self.assertEqual(dict(Room.objects.values_list('id', 'reserved')), {self.room.id: True, stale.id: False})
+        self.assertEqual(reconcile_all(), 0)
+
+        # Tomorrow the first stay has checked out and the second begins
+        out = StringIO()
+        call_command('reconcile_room_occupancy', date=str(self.today + timedelta(days=1)), stdout=out)
+        self.assertIn('0 room(s)', out.getvalue())
+        # The day after, nobody is staying
+        self.assertEqual(reconcile_all(self.today + timedelta(days=3)), 1)
+        self.room.refresh_from_db()
+        self.assertFalse(self.room.reserved)
+
+    def test_command_rejects_bad_date(self):
+        with self.assertRaises(CommandError):
+            call_command('reconcile_room_occupancy', date='tomorrow')
+
+
+class ReservationStreamTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        room = Room.objects.create(room_code='101', price_per_night='80.00')
+        day = timezone.localdate()
+        for n in range(5):
+            RoomReservation.objects.create(
+                room=room, customer=make_customer(f'guest{n}', first_name=f'Guest{n}'),
+                check_in=day + timedelta(days=2 * n), check_out=day + timedelta(days=2 * n + 1),
+            )
+        self.queryset = AllReservationView.queryset.all()
+
+    def test_chunks_join_into_the_full_array(self):
+        pieces = list(stream_json_array(self.queryset, RoomReservationSerializer, chunk_size=2))
+        # Brackets plus three chunks of at most two rows
+        self.assertEqual(len(pieces), 5)
+        self.assertEqual(json.loads(''.join(pieces)), json.loads(json.dumps(
+            RoomReservationSerializer(self.queryset, many=True).data, cls=DjangoJSONEncoder,
+        )))
+        self.assertEqual(''.join(stream_json_array(RoomReservation.objects.none(), RoomReservationSerializer)), '[]')
+
+    def test_stream_param_streams_the_list_in_one_query(self):
+        response = self.client.get('/api/reservations/all_Reservation/', {'stream': 'true'})
+        self.assertTrue(response.streaming)
+        # Rooms and customers come with the rows, so guest names cost nothing extra
+        with self.assertNumQueries(1):
+            rows = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual({row['guest_first_name'] for row in rows}, {f'Guest{n}' for n in range(5)})
+        self.assertEqual(rows, self.client.get('/api/reservations/all_Reservation/').json())
+
+
+# ============================================================================
+# PRODUCT IMAGES
+# ============================================================================
+
+def image_file(name='tea.png', size=(2000, 1000), color='teal'):
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, format='PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+class ProductImageTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.product = make_product(product_code='PRD1', image=image_file())
+
+    def test_renders_every_size_and_format(self):
+        self.assertEqual(pending_products().get(), self.product)
+        self.assertEqual(process_batch(), (1, 0))
+
+        self.product.refresh_from_db()
+        variants = self.product.image_variants
+        self.assertEqual(set(variants), set(VARIANT_SIZES))
+        for size, formats in variants.items():
+            self.assertEqual(set(formats), {'webp', 'jpeg'})
+            for name in formats.values():
+                with default_storage.open(name) as f:
+                    # Scaled down into the box, keeping the 2:1 aspect ratio
+                    width, height = Image.open(f).size
+                self.assertEqual((width, height), (VARIANT_SIZES[size][0], VARIANT_SIZES[size][0] // 2))
+        self.assertFalse(pending_products().exists())
+
+    def test_variant_names_hash_their_bytes(self):
+        process_batch()
+        self.product.refresh_from_db()
+        name = self.product.image_variants['thumb']['webp']
+        with default_storage.open(name) as f:
+            content = f.read()
+        self.assertEqual(name, variant_name(self.product.image.name, 'thumb', 'webp', content))
+        self.assertRegex(name, r'^products/variants/PRD1_thumb\.[0-9a-f]{12}\.webp$')
+
+        # Rendering the same image again reuses the same files
+        self.assertEqual(render_variants(self.product.image.name), self.product.image_variants)
+
+    def test_replacing_the_image_resets_variants(self):
+        process_batch()
+        self.product.refresh_from_db()
+        old_variants = self.product.image_variants
+
+        # Saves that leave the image alone keep the variants
+        self.product.name = 'Green tea'
+        self.product.save()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.image_variants, old_variants)
+
+        self.product.image = image_file(color='olive')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.image_variants, {})
+        self.assertEqual(pending_products().get(), self.product)
+        self.assertFalse(default_storage.exists(old_variants['thumb']['webp']))
+
+    def test_unreadable_image_is_not_retried(self):
+        Product.objects.filter(id=self.product.id).update(image='products/missing.png')
+        self.assertEqual(process_batch(), (0, 1))
+        self.product.refresh_from_db()
+        self.assertIn('error', self.product.image_variants)
+        self.assertFalse(pending_products().exists())
+
+
+class ProductDetailUpdateTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.product = make_product(quantity=5)
+
+    def test_plain_update_returns_the_product(self):
+        response = self.client.patch(f'/api/products/{self.product.id}/', {'quantity': 8}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['quantity'], 8)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 8)
+
+    def test_replenish_adds_to_quantity(self):
+        response = self.client.patch(
+            f'/api/products/{self.product.id}/', {'replenish_quantity': 3}, format='multipart'
+        )
+        self.assertEqual(response.data['quantity'], 8)
+
+
+# ============================================================================
+# CHAT EVENT STREAM
+# ============================================================================
+
+class ChatEventStreamTests(TestCase):
+    def setUp(self):
+        self.session = ChatBot.objects.create(session_id='s1', customer=make_customer())
+        self.messages = [
+            ChatMessage.objects.create(chat_session=self.session, sender='C', message=f'Message {n}')
+            for n in range(3)
+        ]
+        self.channel = chat_hub.session_channel(self.session.id)
+
+    async def test_replays_backlog_then_unsubscribes_on_close(self):
+        stream = chat_event_stream(self.session.id, last_id=self.messages[0].id)
+        self.assertEqual(await anext(stream), 'retry: 3000\n\n')
+        self.assertEqual(chat_hub.broker.subscriber_count(self.channel), 1)
+
+        for message in self.messages[1:]:
+            frame = await anext(stream)
+            self.assertTrue(frame.startswith(f'id: {message.id}\nevent: message\n'))
+            self.assertIn(message.message, frame)
+
+        await stream.aclose()
+        self.assertEqual(chat_hub.broker.subscriber_count(self.channel), 0)
+
+    async def test_live_messages_skip_those_already_replayed(self):
+        stream = chat_event_stream(self.session.id, last_id=self.messages[1].id)
+        await anext(stream)
+        self.assertTrue((await anext(stream)).startswith(f'id: {self.messages[2].id}\n'))
+
+        # A publish racing the backlog read repeats a replayed id; only the new one goes out
+        chat_hub.publish_message(self.messages[2])
+        late = await ChatMessage.objects.acreate(chat_session=self.session, sender='A', message='Late reply')
+        chat_hub.publish_message(late)
+        self.assertTrue((await anext(stream)).startswith(f'id: {late.id}\n'))
+        await stream.aclose()
+
+    def test_stream_that_never_starts_holds_no_subscription(self):
+        chat_event_stream(self.session.id)
+        self.assertEqual(chat_hub.broker.subscriber_count(self.channel), 0)
+
+
+# ============================================================================
+# CHAT MESSAGES
+# ============================================================================
+
+class ChatMessageCursorTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.session = ChatBot.objects.create(session_id='s1', customer=make_customer())
+        other = ChatBot.objects.create(session_id='s2', customer=make_customer('other'))
+        self.messages = [
+            ChatMessage.objects.create(chat_session=self.session, sender='C', message=f'Message {n}')
+            for n in range(3)
+        ]
+        ChatMessage.objects.create(chat_session=other, sender='C', message='Elsewhere')
+        self.url = f'/api/chat/sessions/{self.session.id}/messages/'
+
+    def test_after_id_returns_only_the_delta(self):
+        response = self.client.get(self.url, {'after_id': self.messages[0].id})
+        self.assertEqual([m['id'] for m in response.data['messages']], [m.id for m in self.messages[1:]])
+        self.assertEqual(response.data['last_id'], self.messages[2].id)
+
+        # Nothing new: the high-water mark stays where the client left it
+        response = self.client.get(self.url, {'after_id': response.data['last_id']})
+        self.assertEqual(response.data['messages'], [])
+        self.assertEqual(response.data['last_id'], self.messages[2].id)
+
+    def test_since_filters_by_timestamp(self):
+        ChatMessage.objects.filter(id=self.messages[0].id).update(timestamp=timezone.now() - timedelta(hours=1))
+        since = (timezone.now() - timedelta(minutes=30)).isoformat()
+        response = self.client.get('/api/chat/messages/', {'chat_session': self.session.id, 'since': since})
+        self.assertEqual([m['id'] for m in response.data['messages']], [m.id for m in self.messages[1:]])
+
+    def test_invalid_cursor_is_rejected(self):
+        self.assertEqual(self.client.get(self.url, {'after_id': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'since': 'yesterday'}).status_code, 400)
+
+    def test_without_cursor_returns_the_full_history(self):
+        response = self.client.get(self.url)
+        self.assertEqual([m['id'] for m in response.data], [m.id for m in self.messages])
+
+
+class ChatSessionListTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.sessions = [
+            ChatBot.objects.create(session_id=f's{n}', customer=make_customer(f'guest{n}')) for n in range(4)
+        ]
+        for session in self.sessions:
+            for sender in ('C', 'A'):
+                ChatMessage.objects.create(
+                    chat_session=session, sender=sender, message=f'{sender} in {session.session_id}'
+                )
+
+    def test_list_is_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/chat/sessions/')
+        self.assertEqual(len(response.data), 4)
+        self.assertEqual(
+            {session['last_message']['message'] for session in response.data},
+            {f'A in {session.session_id}' for session in self.sessions},
+        )
+        # Paginated: the page plus its count
+        with self.assertNumQueries(2):
+            self.client.get('/api/chat/sessions/', {'page_size': 2})
+
+    def test_last_message_follows_new_messages(self):
+        session = self.sessions[0]
+        reply = ChatMessage.objects.create(chat_session=session, sender='C', message='Thanks')
+        session.refresh_from_db()
+        self.assertEqual(session.last_message, reply)
+
+        response = self.client.post(f'/api/chat/sessions/{session.id}/send/', {'sender': 'A', 'message': 'Welcome'})
+        session.refresh_from_db()
+        self.assertEqual(session.last_message_id, response.data['id'])
+
+    def test_empty_session_has_no_last_message(self):
+        empty = ChatBot.objects.create(session_id='empty', customer=make_customer('quiet'))
+        self.assertIsNone(self.client.get(f'/api/chat/sessions/{empty.id}/').data['last_message'])
+
+
+# ============================================================================
+# ANALYTICS
+# ============================================================================
+
+class AnalyticsData:
+    """Orders over two weeks and room stays around the first one, all in the past"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        today = timezone.localdate()
+        # Monday two weeks back, so week buckets are predictable
+        self.monday = today - timedelta(days=today.weekday() + 14)
+        customer = make_customer()
+
+        tea, cake = make_product('Tea', price='10.00'), make_product('Cake', price='5.00')
+        tea.categories.set([ProductCategory.objects.create(name='Drinks')])
+        cake.categories.set([ProductCategory.objects.create(name='Food')])
+        self.orders = [
+            self.order(customer, 0, [(tea, 2)]),
+            self.order(customer, 1, [(cake, 1)]),
+            self.order(customer, 7, [(tea, 1)]),
+            self.order(customer, 1, [(cake, 20)], status='CA'),
+        ]
+
+        general = [Room.objects.create(room_code=f'G{n}', price_per_night='100.00') for n in range(2)]
+        suite = Room.objects.create(room_code='S1', categories='S', price_per_night='300.00')
+        self.stays = [
+            self.stay(customer, general[0], -2, 2, '400.00'),
+            self.stay(customer, general[1], 5, 9, '400.00'),
+            self.stay(customer, suite, 1, 3, '600.00', status='canceled'),
+            self.stay(customer, suite, 3, 4, '300.00', status='checked_out'),
+        ]
+
+    def on(self, offset):
+        return self.monday + timedelta(days=offset)
+
+    def order(self, customer, offset, lines, status='C'):
+        order = Order.objects.create(customer=customer, total_amount='0.00', status=status)
+        for product, quantity in lines:
+            OrderItem.objects.create(order=order, product=product, quantity=quantity, price=product.price)
+        Order.objects.filter(id=order.id).update(
+            created_at=timezone.make_aware(datetime.combine(self.on(offset), time(12)))
+        )
+        order.refresh_from_db()
+        return order
+
+    def stay(self, customer, room, first, last, amount, status='confirmed'):
+        return RoomReservation.objects.create(
+            room=room, customer=customer, check_in=self.on(first), check_out=self.on(last),
+            total_amount=amount, status=status,
+        )
+
+
+class AnalyticsTests(AnalyticsData, TestCase):
+    def test_revenue_per_day_and_category(self):
+        report = revenue_report(self.on(0), self.on(14), 'day')
+        self.assertEqual((report['total_revenue'], report['total_orders']), ('35.00', 3))
+        self.assertEqual(
+            [(row['period'], row['revenue'], row['orders']) for row in report['periods']],
+            [(self.on(0).isoformat(), '20.00', 1), (self.on(1).isoformat(), '5.00', 1),
+             (self.on(7).isoformat(), '10.00', 1)],
+        )
+        self.assertEqual(
+            [(row['category'], row['revenue'], row['items']) for row in report['categories']],
+            [('Drinks', '30.00', 3), ('Food', '5.00', 1)],
+        )
+
+    def test_revenue_per_week(self):
+        report = revenue_report(self.on(0), self.on(14), 'week')
+        self.assertEqual(
+            [(row['period'], row['revenue'], row['orders']) for row in report['periods']],
+            [(self.on(0).isoformat(), '25.00', 2), (self.on(7).isoformat(), '10.00', 1)],
+        )
+
+    def test_occupancy_counts_only_nights_inside_the_window(self):
+        report = occupancy_report(self.on(0), self.on(7))
+        categories = {row['category']: row for row in report['categories']}
+        general, suite = categories['G'], categories['S']
+        self.assertEqual((general['rooms'], general['available_nights'], general['sold_nights']), (2, 14, 4))
+        self.assertEqual(
+            (general['room_revenue'], general['adr'], general['revpar'], general['occupancy']),
+            ('400.00', '100.00', '28.57', 0.2857),
+        )
+        self.assertEqual((suite['sold_nights'], suite['room_revenue'], suite['adr']), (1, '300.00', '300.00'))
+        self.assertEqual(
+            (report['overall']['sold_nights'], report['overall']['adr'], report['overall']['revpar']),
+            (5, '140.00', '33.33'),
+        )
+
+    def test_reports_are_cached_per_window(self):
+        params = {'start': self.on(0), 'end': self.on(14), 'bucket': 'week'}
+        first = self.client.get('/api/analytics/revenue/', params).data
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/analytics/revenue/', params).data, first)
+        response = self.client.get('/api/analytics/revenue/', {**params, 'bucket': 'year'})
+        self.assertEqual(response.status_code, 400)
+
+
+class DailyRollupTests(AnalyticsData, TestCase):
+    def reports(self):
+        cache.clear()
+        return [
+            revenue_report(self.on(0), self.on(14), 'day'),
+            revenue_report(self.on(0), self.on(14), 'week'),
+            occupancy_report(self.on(0), self.on(7)),
+            occupancy_report(self.on(-3), self.on(12)),
+        ]
+
+    def live_reports(self):
+        with mock.patch('GuestManagementSystemtApp.analytics._covered_by_rollups', return_value=False):
+            return self.reports()
+
+    def test_rollups_match_live_analytics(self):
+        live = self.live_reports()
+        build_rollups()
+        self.assertTrue(DailySales.objects.exists())
+        self.assertEqual(self.reports(), live)
+        # Historical windows no longer touch the source tables: two lookups
+        # to see the rollups cover them, then the three rollup aggregates
+        cache.clear()
+        with self.assertNumQueries(5):
+            revenue_report(self.on(0), self.on(14), 'day')
+
+    def test_incremental_rebuild_touches_only_changed_days(self):
+        build_rollups()
+
+        self.orders[0].status = 'CA'
+        self.orders[0].save()
+        self.stays[1].status = 'canceled'
+        self.stays[1].save()
+        rebuilt = build_rollups()
+
+        self.assertIn(self.on(0), rebuilt)
+        self.assertTrue({self.on(day) for day in range(5, 9)} <= rebuilt)
+        # Day 1 only has an unchanged order and part of an unchanged stay
+        self.assertNotIn(self.on(1), rebuilt)
+        self.assertNotIn(self.on(10), rebuilt)
+        self.assertEqual(self.reports(), self.live_reports())
+        self.assertEqual(revenue_report(self.on(0), self.on(1), 'day')['total_revenue'], '0.00')
+
+
+# ============================================================================
+# BULK ORDER STATUS
+# ============================================================================
+
+class BulkOrderStatusTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.orders = [
+            Order.objects.create(customer=make_customer(f'guest{n}'), total_amount='10.00') for n in range(4)
+        ]
+
+    def patch(self, changes):
+        return self.client.patch('/api/admin/orders/status/', changes, format='json')
+
+    def statuses(self):
+        return [order.status for order in Order.objects.order_by('id')]
+
+    def test_one_update_per_target_status_and_one_email_batch(self):
+        a, b, c, d = (order.id for order in self.orders)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.patch([
+                {'id': a, 'status': 'S'}, {'id': b, 'status': 'S'}, {'id': c, 'status': 'CA'}, {'id': d, 'status': 'P'},
+            ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['updated_ids'], response.data['unchanged_ids']), ([a, b, c], [d]))
+        self.assertEqual(self.statuses(), ['S', 'S', 'CA', 'P'])
+
+        sql = [query['sql'] for query in queries.captured_queries]
+        self.assertEqual(sum(statement.startswith('UPDATE') for statement in sql), 2)
+        self.assertEqual(sum(statement.startswith('INSERT') for statement in sql), 1)
+        self.assertEqual(
+            sorted(EmailOutbox.objects.values_list('recipient', flat=True)),
+            ['guest0@example.com', 'guest1@example.com', 'guest2@example.com'],
+        )
+
+    def test_invalid_status_rejects_the_whole_batch(self):
+        response = self.patch([{'id': self.orders[0].id, 'status': 'S'}, {'id': self.orders[1].id, 'status': 'X'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.statuses(), ['P'] * 4)
+        self.assertFalse(EmailOutbox.objects.exists())
+
+    def test_unknown_and_repeated_ids_are_rejected(self):
+        response = self.patch([{'id': self.orders[0].id, 'status': 'S'}, {'id': 999, 'status': 'S'}])
+        self.assertEqual((response.status_code, response.data['missing_ids']), (400, [999]))
+        response = self.patch([{'id': self.orders[0].id, 'status': 'S'}, {'id': self.orders[0].id, 'status': 'D'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.patch([]).status_code, 400)
+        self.assertEqual(self.statuses(), ['P'] * 4)
+
+
+# ============================================================================
+# PRODUCT CATALOG CACHE
+# ============================================================================
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.drinks = ProductCategory.objects.create(name='Drinks')
+        self.tea = make_product('Tea')
+        self.tea.categories.set([self.drinks])
+        make_product('Cake')
+
+    def test_warm_list_is_served_from_cache(self):
+        # Products, then every product's categories at once
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/products/')
+        self.assertEqual([product['name'] for product in response.data], ['Tea', 'Cake'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/products/').data, response.data)
+        # Each category filter is its own entry
+        filtered = self.client.get('/api/products/', {'category': self.drinks.id})
+        self.assertEqual([product['name'] for product in filtered.data], ['Tea'])
+
+    def test_etag_revalidation_returns_304(self):
+        etag = self.client.get('/api/products/')['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response['ETag']), (304, etag))
+        self.assertFalse(response.content)
+
+        detail = self.client.get(f'/api/products/{self.tea.id}/')
+        response = self.client.get(f'/api/products/{self.tea.id}/', HTTP_IF_NONE_MATCH=detail['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_writes_bump_the_version(self):
+        etag = self.client.get('/api/products/')['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tea.price = Decimal('12.00')
+            self.tea.save()
+        response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['price'], '12.00')
+
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tea.categories.clear()
+        response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response.data[0]['categories']), (200, []))
+
+
+# ============================================================================
+# PRODUCT SEARCH
+# ============================================================================
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        drinks = ProductCategory.objects.create(name='Drinks')
+        self.green_tea = make_product('Green tea', description='Loose leaf')
+        self.green_tea.categories.set([drinks])
+        self.cake = make_product('Chocolate cake', description='Goes well with tea')
+        self.lemonade = make_product('Lemonade')
+        self.lemonade.categories.set([drinks])
+        self.brulee = make_product('Crème brûlée')
+
+    def test_name_hits_rank_above_description_hits(self):
+        self.assertEqual(search_product_ids('tea'), [self.green_tea.id, self.cake.id])
+
+    def test_prefix_typo_and_category_matches(self):
+        self.assertEqual(search_product_ids('choc'), [self.cake.id])
+        self.assertEqual(search_product_ids('chocolste'), [self.cake.id])
+        self.assertEqual(set(search_product_ids('drinks')), {self.green_tea.id, self.lemonade.id})
+        self.assertEqual(search_product_ids('creme brulee'), [self.brulee.id])
+
+    def test_every_term_must_match(self):
+        self.assertEqual(search_product_ids('green leaf'), [self.green_tea.id])
+        self.assertEqual(search_product_ids('green cake'), [])
+        # Too short for typo tolerance
+        self.assertEqual(search_product_ids('cke'), [])
+
+    def test_saves_update_the_index_in_place(self):
+        search_product_ids('tea')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lemonade.name = 'Oolong'
+            self.lemonade.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(search_product_ids('oolong'), [self.lemonade.id])
+        self.assertEqual(search_product_ids('lemonade'), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lemonade.is_active = False
+            self.lemonade.save()
+        self.assertEqual(search_product_ids('oolong'), [])
+
+    def test_endpoint_pages_ranked_results(self):
+        response = self.client.get('/api/products/search/', {'q': 'tea'})
+        self.assertEqual([product['id'] for product in response.data], [self.green_tea.id, self.cake.id])
+        response = self.client.get('/api/products/search/', {'q': 'tea', 'page': 2, 'page_size': 1})
+        self.assertEqual((response.data['count'], response.data['results'][0]['id']), (2, self.cake.id))
+
+
+# ============================================================================
+# AUTOCOMPLETE
+# ============================================================================
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.cake = make_product('Coffee cake')
+        self.coffee = make_product('Iced coffee')
+        self.room = Room.objects.create(room_code='CO-101', price_per_night='80.00')
+        self.customer = make_customer('cora', first_name='Cora', last_name='Cole')
+
+    def labels(self, params, user=None):
+        self.client.force_authenticate(user=user)
+        response = self.client.get('/api/autocomplete/', params)
+        return [(entry['kind'], entry['label']) for entry in response.data]
+
+    def test_matches_any_word_of_a_label(self):
+        self.assertEqual(self.labels({'q': 'cak'}), [('product', 'Coffee cake')])
+        self.assertEqual(self.labels({'q': 'coffee ca'}), [('product', 'Coffee cake')])
+        self.assertEqual(
+            self.labels({'q': 'co', 'kind': 'product'}), [('product', 'Coffee cake'), ('product', 'Iced coffee')],
+        )
+
+    def test_customers_are_only_offered_to_staff(self):
+        self.assertEqual(self.labels({'q': 'co'}), [
+            ('product', 'Coffee cake'), ('product', 'Iced coffee'), ('room', 'CO-101'),
+        ])
+        self.assertEqual(self.labels({'q': 'cora', 'kind': 'customer'}), [])
+
+        staff = User.objects.create(name='Staff', email='staff@example.com', phone='1')
+        self.assertIn(('customer', 'Cora Cole'), self.labels({'q': 'co'}, user=staff))
+        self.assertEqual(self.labels({'q': 'cole', 'kind': 'customer'}, user=staff), [('customer', 'Cora Cole')])
+
+    def test_saves_refresh_the_index(self):
+        self.labels({'q': 'co'})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.coffee.name = 'Iced latte'
+            self.coffee.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(autocomplete('lat', ['product']), [
+                {'kind': 'product', 'id': self.coffee.id, 'label': 'Iced latte'},
+            ])
+        self.assertEqual(autocomplete('coffee', ['product'])[0]['id'], self.cake.id)
+        self.assertEqual(len(autocomplete('coffee', ['product'])), 1)
+
+    def test_invalid_kind_is_rejected(self):
+        self.assertEqual(self.client.get('/api/autocomplete/', {'q': 'co', 'kind': 'order'}).status_code, 400)
+
+
+# ============================================================================
+# MEDIA FILES
+# ============================================================================
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.content = bytes(range(256)) * 4
+        self.variant = 'products/variants/PRD1_thumb.0123456789ab.webp'
+        for name in ('products/PRD1.jpg', self.variant):
+            os.makedirs(os.path.join(self.media_root, os.path.dirname(name)), exist_ok=True)
+            with open(os.path.join(self.media_root, name), 'wb') as f:
+                f.write(self.content)
+        self.client = APIClient()
+
+    def get(self, path, **headers):
+        response = self.client.get(f'/api/media/{path}', **headers)
+        self.addCleanup(response.close)
+        return response
+
+    def test_whole_file_with_validators(self):
+        response = self.get('products/PRD1.jpg')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Cache-Control'], f'public, max-age={MUTABLE_MAX_AGE}')
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        response = self.get('products/PRD1.jpg', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual((response.status_code, response.content), (304, b''))
+
+    def test_hashed_variants_are_immutable(self):
+        response = self.get(self.variant)
+        self.assertEqual(response['ETag'], '"0123456789ab"')
+        self.assertEqual(response['Cache-Control'], f'public, max-age={IMMUTABLE_MAX_AGE}, immutable')
+
+    def test_byte_ranges(self):
+        response = self.get('products/PRD1.jpg', HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[10:20])
+
+        response = self.get('products/PRD1.jpg', HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-5:])
+
+        # A stale If-Range gets the whole current file instead
+        response = self.get('products/PRD1.jpg', HTTP_RANGE='bytes=10-19', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_unsatisfiable_range(self):
+        response = self.get('products/PRD1.jpg', HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+
+    def test_paths_outside_media_root_and_non_files_are_404(self):
+        with open(os.path.join(os.path.dirname(self.media_root), 'secret.txt'), 'w') as f:
+            f.write('secret')
+        self.addCleanup(os.remove, f.name)
+        for path in ('../secret.txt', '%2e%2e/secret.txt', 'products/', 'products/missing.jpg'):
+            self.assertEqual(self.get(path).status_code, 404, path)
+        self.assertEqual(self.client.post('/api/media/products/PRD1.jpg').status_code, 405)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/')
+    def test_accel_redirect_hands_off_to_the_proxy(self):
+        response = self.get(self.variant)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.variant}')
+        self.assertEqual(response.content, b'')
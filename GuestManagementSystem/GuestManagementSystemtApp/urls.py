@@ -1,8 +1,7 @@
-from django.urls import path, include
+from django.urls import path, include, re_path
 from rest_framework.routers import DefaultRouter
 from . import views
-from django.conf import settings
-from django.conf.urls.static import static
+from . import media
 
 urlpatterns = [
     # Authentication URLs
@@ -27,15 +26,20 @@ urlpatterns = [
     path('products/', views.ProductListCreateView.as_view(), name='product-list-create'),
     path('products/<int:pk>/', views.ProductDetailView.as_view(), name='product-detail'),
     path('products/search/', views.search_products, name='product-search'),
+    path('products/import/', views.ProductImportView.as_view(), name='product-import'),
+    path('products/export/', views.export_products_file, name='product-export'),
+    path('autocomplete/', views.autocomplete, name='autocomplete'),
   
     # Room URLs
     path('rooms/', views.RoomListCreateView.as_view(), name='room-list-create'),
     path('rooms/<int:pk>/', views.RoomDetailView.as_view(), name='room-detail'),
     path('rooms/search/', views.search_rooms, name='room-search'),
+    path('rooms/calendar/', views.room_availability_calendar, name='room-calendar'),
     
     # Cart URLs
     path('cart/', views.CartView.as_view(), name='cart'),
     path('cart/items/', views.CartItemListCreateView.as_view(), name='cart-item-list-create'),
+    path('cart/items/bulk/', views.BulkCartItemsView.as_view(), name='cart-item-bulk'),
     path('cart/items/<int:pk>/', views.CartItemDetailView.as_view(), name='cart-item-detail'),
     path('cart/clear/', views.ClearCartView.as_view(), name='cart-clear'),
     
@@ -44,6 +48,7 @@ urlpatterns = [
     path('orders/<int:pk>/', views.OrderDetailView.as_view(), name='order-detail'),
     path('orders/<int:pk>/status/', views.UpdateOrderStatusView.as_view(), name='order-status-update'),
     path('admin/orders/', views.AllOrdersView.as_view(), name='admin-order-list'),
+    path('admin/orders/status/', views.BulkUpdateOrderStatusView.as_view(), name='admin-order-status-bulk'),
     
     # Chat URLs
     path('chat/sessions/', views.ChatSessionListCreateView.as_view(), name='chat-session-list-create'),
@@ -55,6 +60,10 @@ urlpatterns = [
     # Messages within a session
     path('chat/sessions/<int:pk>/messages/', views.ChatSessionMessagesView.as_view(), name='chat-session-messages'),
     path('chat/sessions/<int:pk>/send/', views.ChatSessionSendMessageView.as_view(), name='chat-session-send'),
+
+    # Push streams (Server-Sent Events, served via ASGI)
+    path('chat/stream/', views.chat_sessions_stream, name='chat-stream'),
+    path('chat/sessions/<int:pk>/stream/', views.chat_session_stream, name='chat-session-stream'),
     # Feedback URLs
     path('feedback/', views.FeedbackListCreateView.as_view(), name='feedback-list-create'),
     path('feedback/<int:pk>/', views.FeedbackDetailView.as_view(), name='feedback-detail'),
@@ -65,6 +74,8 @@ urlpatterns = [
     
     # Dashboard URLs
     path('dashboard/stats/', views.dashboard_stats, name='dashboard-stats'),
+    path('analytics/revenue/', views.revenue_analytics, name='analytics-revenue'),
+    path('analytics/occupancy/', views.occupancy_analytics, name='analytics-occupancy'),
 
     path('reservations/', views.ReservationListCreateView.as_view(), name='reservation-list-create'),
     path('reservations/<int:pk>/', views.ReservationDetailView.as_view(), name='reservation-detail'),
@@ -74,4 +85,7 @@ urlpatterns = [
 
     path('promotions/', views.PromotionListCreateView.as_view(), name='promotion-list-create'),
     path('promotions/<int:pk>/', views.PromotionDetailView.as_view(), name='promotion-detail'),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+
+    # Media files (strong ETags, Range requests, immutable hashed variants)
+    re_path(r'^media/(?P<path>.+)$', media.serve_media, name='media'),
+]
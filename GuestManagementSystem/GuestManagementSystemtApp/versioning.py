@@ -0,0 +1,28 @@
+"""
+Shared version counters kept in the cache.
+
+In-process caches and indexes record the version they were built at and
+compare it with the shared one to notice writes made by other processes.
+Counters start from the current time so a cache restart never hands out a
+number that was used before.
+"""
+import time
+
+from django.core.cache import cache
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    """Increment the counter and return the new value"""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), None)
+        return cache.get(key)
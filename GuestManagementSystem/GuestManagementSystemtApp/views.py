@@ -4,93 +4,105 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.exceptions import ValidationError
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import authenticate
 from django.db import transaction
+from django.db import models
+from django.db.models import Case, F, Prefetch, Q, Value, When
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
-from django.http import Http404
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import timedelta
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.filters import SearchFilter, OrderingFilter
 from rest_framework.response import Response
 from rest_framework import status as http_status
-from django.core.mail import send_mail
 
 from .models import (
     User, Customer, ProductCategory, Product, Room, Cart, CartItem,
     Order, OrderItem, ChatBot, ChatMessage, Feedback, AIInsight, UserToken,RoomReservation,Promotion
 )
 from .serializers import (
-    CustomerLoginSerializer, UserLoginSerializer, UserSerializer, UserUpdateSerializer,
+    LoginSerializer, UserSerializer, UserUpdateSerializer,
     PasswordResetSerializer, UserListSerializer, CustomerRegistrationSerializer,
     CustomerSerializer, ProductCategorySerializer, ProductSerializer,
     RoomSerializer, CartSerializer, CartItemSerializer, OrderSerializer,
     CreateOrderSerializer, OrderItemSerializer, ChatBotSerializer,
     ChatMessageSerializer, FeedbackSerializer,ChatBotDetailSerializer,
     AIInsightSerializer,RoomReservationSerializer,
-    CreateRoomReservationSerializer,UpdateRoomReservationSerializer,PromotionSerializer,ReservationStatusUpdateSerializer
+    CreateRoomReservationSerializer,UpdateRoomReservationSerializer,PromotionSerializer,ReservationStatusUpdateSerializer,
+    RoomAvailabilitySerializer, OrderListSerializer, OrderStatusChangeSerializer, BulkCartSerializer,
+)
+from .realtime import chat_event_stream
+from .pagination import (
+    KeysetPagination, IdKeysetPagination, ChronologicalKeysetPagination, OptionalPageNumberPagination,
+    KeysetOrderingFilter,
 )
+from .availability import annotate_availability, availability_calendar
+from .occupancy import reservation_changed
+from .streaming import StreamingListMixin
+from .stats import get_dashboard_stats
+from .analytics import BUCKETS, occupancy_report, revenue_report
+from .authentication import issue_token, revoke_token, token_expires_at
+from .outbox import build_email, enqueue_emails
+from .catalog import catalog_response, invalidate_catalog
+from .search import search_product_ids
+from .autocomplete import autocomplete as autocomplete_entries
+from .product_io import FORMATS as PRODUCT_FILE_FORMATS, ImportFileError, export_products, format_for, import_products, read_rows
 
 
 # ============================================================================
 # AUTHENTICATION VIEWS
 # ============================================================================
 
+def token_expires_in(token):
+    return max(int((token_expires_at(token) - timezone.now()).total_seconds()), 0)
+
+
 class LoginView(APIView):
     """Enhanced login view for both customers and staff using separate serializers"""
     permission_classes = [AllowAny]
 
     def post(self, request):
-        data = request.data
-        print(f"Login attempt with data: {data}")
-
-        # Try user (staff) login first
-        user_serializer = UserLoginSerializer(data=data)
-        if user_serializer.is_valid():
-            user = user_serializer.validated_data['user']
-            token, created = UserToken.objects.get_or_create(user=user)
+        serializer = LoginSerializer(data=request.data)
+        if not serializer.is_valid():
             return Response({
-                'success': True,
-                'message': 'Login successful',
-                'token': token.key,
-                'user_type': 'staff',
-                'user': UserListSerializer(user).data,
-                'expires_in': 86400
-            }, status=status.HTTP_200_OK)
-        
-        customer_serializer = CustomerLoginSerializer(data=data)
-        if customer_serializer.is_valid():
-            customer = customer_serializer.validated_data['customer']
-            token, created = UserToken.objects.get_or_create(customer=customer)
-            
+                'success': False,
+                'message': 'Incorrect email or password'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        account = serializer.validated_data['account']
+        if isinstance(account, User):
+            token = issue_token(user=account)
             return Response({
                 'success': True,
                 'message': 'Login successful',
                 'token': token.key,
-                'user_type': 'customer',
-                'user': CustomerSerializer(customer).data,
-                'customer_id': str(customer.id),
-                'expires_in': 86400
+                'user_type': 'staff',
+                'user': UserListSerializer(account).data,
+                'expires_in': token_expires_in(token)
             }, status=status.HTTP_200_OK)
 
+        token = issue_token(customer=account)
         return Response({
-            'success': False,
-            'message': 'Incorrect email or password'
-        }, status=status.HTTP_400_BAD_REQUEST)
+            'success': True,
+            'message': 'Login successful',
+            'token': token.key,
+            'user_type': 'customer',
+            'user': CustomerSerializer(account).data,
+            'customer_id': str(account.id),
+            'expires_in': token_expires_in(token)
+        }, status=status.HTTP_200_OK)
 
 class LogoutView(APIView):
     """Logout view for both user types"""
     def post(self, request):
-        try:
-            # Try to delete customer token first
-            if hasattr(request.user, 'auth_token'):
-                request.user.auth_token.delete()
-            # Try to delete staff token
-            elif hasattr(request.user, 'auth_token'):
-                request.user.auth_token.delete()
-            return Response({'message': 'Successfully logged out'})
-        except Exception:
-            return Response({'message': 'Successfully logged out'})
+        # request.auth is the UserToken key for token-authenticated requests
+        if isinstance(request.auth, str):
+            revoke_token(request.auth)
+        return Response({'message': 'Successfully logged out'})
 
 # ============================================================================
 # USER MANAGEMENT VIEWS (STAFF)
@@ -98,7 +110,7 @@ class LogoutView(APIView):
 
 class UserListCreateView(generics.ListCreateAPIView):
     """List all users or create a new user"""
-    queryset = User.objects.all()
+    queryset = User.objects.order_by('id')
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -151,10 +163,11 @@ class CustomerProfileView(generics.RetrieveUpdateAPIView):
         return self.request.user
 
 
-class CustomerListView(generics.ListAPIView):
-    """List all customers (Admin only)"""
+class CustomerListView(StreamingListMixin, generics.ListAPIView):
+    """List all customers (Admin only); ?stream=true for a streamed full export"""
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
+    pagination_class = KeysetPagination
 
 
 # ============================================================================
@@ -163,7 +176,7 @@ class CustomerListView(generics.ListAPIView):
 
 class ProductCategoryListCreateView(generics.ListCreateAPIView):
     """List all categories or create new category"""
-    queryset = ProductCategory.objects.all()
+    queryset = ProductCategory.objects.order_by('id')
     serializer_class = ProductCategorySerializer
 
 
@@ -179,7 +192,7 @@ class ProductCategoryDetailView(generics.RetrieveUpdateDestroyAPIView):
 
 
 class ProductListCreateView(generics.ListCreateAPIView):
-    queryset = Product.objects.filter(is_active=True)
+    queryset = Product.objects.filter(is_active=True).prefetch_related('categories').order_by('id')
     serializer_class = ProductSerializer
     parser_classes = (MultiPartParser, FormParser)  # ✅ Allows image upload
 
@@ -190,12 +203,78 @@ class ProductListCreateView(generics.ListCreateAPIView):
             queryset = queryset.filter(categories__id=category)
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        # Paginated requests go straight to the database
+        if any(param in request.query_params for param in getattr(self.paginator, 'trigger_params', ())):
+            return super().list(request, *args, **kwargs)
+        category = request.query_params.get('category') or 'all'
+        return catalog_response(
+            request, f'products:{category}',
+            lambda: self.get_serializer(self.get_queryset(), many=True).data,
+        )
+
+
+class ProductImportView(APIView):
+    """Create or update products from a CSV or JSONL file (Admin only)
+
+    Send the file as the request body (Content-Type text/csv or
+    application/x-ndjson) or as a multipart ``file`` field; ``?file_format=``
+    overrides the detection and ``?dry_run=true`` validates without writing.
+    """
+
+    def post(self, request):
+        if not getattr(request.user, 'is_staff', False):
+            return Response({"detail": "Only staff can import products."}, status=status.HTTP_403_FORBIDDEN)
+
+        upload = request.FILES.get('file') if request.content_type.startswith('multipart/') else None
+        if upload is not None:
+            source, detected = upload, format_for(upload.name, upload.content_type)
+        else:
+            # The body is read line by line straight off the request stream
+            source, detected = request._request, format_for(content_type=request.content_type)
+        file_format = request.query_params.get('file_format') or detected or 'csv'
+        if file_format not in PRODUCT_FILE_FORMATS:
+            return Response(
+                {"detail": f"file_format must be one of {', '.join(PRODUCT_FILE_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            result = import_products(
+                read_rows(source, file_format), dry_run=request.query_params.get('dry_run') == 'true',
+            )
+        except ImportFileError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_400_BAD_REQUEST if result['errors'] else status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def export_products_file(request):
+    """Every product as a streamed CSV (default) or JSONL download (Admin only)"""
+    if not getattr(request.user, 'is_staff', False):
+        return Response({"detail": "Only staff can export products."}, status=status.HTTP_403_FORBIDDEN)
+    file_format = request.GET.get('file_format', 'csv')
+    if file_format not in PRODUCT_FILE_FORMATS:
+        return Response(
+            {"detail": f"file_format must be one of {', '.join(PRODUCT_FILE_FORMATS)}"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    response = StreamingHttpResponse(export_products(file_format), content_type=PRODUCT_FILE_FORMATS[file_format])
+    response['Content-Disposition'] = f'attachment; filename="products.{file_format}"'
+    return response
+
 
 class ProductDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Product.objects.all()
+    queryset = Product.objects.prefetch_related('categories')
     serializer_class = ProductSerializer
     parser_classes = (MultiPartParser, FormParser)
 
+    def retrieve(self, request, *args, **kwargs):
+        return catalog_response(
+            request, f'product:{kwargs["pk"]}',
+            lambda: self.get_serializer(self.get_object()).data,
+        )
+
     def update(self, request, *args, **kwargs):
         partial = kwargs.pop('partial', False)
         instance = self.get_object()
@@ -216,7 +295,8 @@ class ProductDetailView(generics.RetrieveUpdateDestroyAPIView):
             serializer = self.get_serializer(instance)
             return Response(serializer.data)
 
-        # Otherwise, proceed with normal update (replace 
+        # Otherwise, proceed with normal update (replaces quantity)
+        return super().update(request, *args, partial=partial, **kwargs)
 
 
 # ============================================================================
@@ -225,7 +305,7 @@ class ProductDetailView(generics.RetrieveUpdateDestroyAPIView):
 
 class RoomListCreateView(generics.ListCreateAPIView):
     """List all rooms (active and inactive) or create new room"""
-    queryset = Room.objects.all()  # Show all rooms regardless of is_active
+    queryset = Room.objects.order_by('id')  # Show all rooms regardless of is_active
     serializer_class = RoomSerializer
 
     def get_queryset(self):
@@ -263,11 +343,14 @@ class ReservationDetailView(generics.RetrieveUpdateDestroyAPIView):
 
 
 
-class AllReservationView(APIView):
-    def get(self, request):
-        reservations = RoomReservation.objects.select_related('room').order_by('-created_at')
-        serializer = RoomReservationSerializer(reservations, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+class AllReservationView(StreamingListMixin, generics.ListAPIView):
+    """
+    List all reservations (Admin only).
+    ?cursor= / ?page_size= to paginate, ?stream=true for a streamed full export.
+    """
+    queryset = RoomReservation.objects.select_related('room', 'customer').order_by('-created_at')
+    serializer_class = RoomReservationSerializer
+    pagination_class = KeysetPagination
     
 class ReservationListCreateView(generics.ListCreateAPIView):
     """
@@ -302,12 +385,7 @@ class ReservationListCreateView(generics.ListCreateAPIView):
         )
         serializer.is_valid(raise_exception=True)
         serializer.save()
-
-        # Side effects on room.reserved flag based on new state
-        room = reservation.room
-        if not room.reserved:
-                room.reserved = True
-                room.save(update_fields=['reserved'])
+        reservation_changed(reservation)
 
         # Return full reservation payload
         return Response(RoomReservationSerializer(reservation).data, status=status.HTTP_200_OK)
@@ -317,16 +395,7 @@ class ReservationListCreateView(generics.ListCreateAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         reservation = serializer.save()
-        today = timezone.localdate()
-        room = reservation.room
-        if not room.reserved:
-            room.reserved = True
-            room.save(update_fields=['reserved'])
-        
-        is_currently_occupied = reservation.check_in <= today < reservation.check_out
-        if is_currently_occupied and not room.reserved:
-            room.reserved = True
-            room.save(update_fields=['reserved'])
+        reservation_changed(reservation)
 
         out = RoomReservationSerializer(reservation)
         return Response(out.data, status=status.HTTP_201_CREATED)
@@ -347,20 +416,7 @@ class ReservationStatusUpdateView(generics.UpdateAPIView):
         serializer = self.get_serializer(reservation, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
         serializer.save()
-
-        # Optional side-effect: keep room.reserved flag in sync
-        room = reservation.room
-        if reservation.status in ("confirmed", "checked_in") and not room.reserved:
-            room.reserved = True
-            room.save(update_fields=["reserved"])
-        elif reservation.status in ("checked_out", "canceled") and room.reserved:
-            # Free the room only if there is no other active reservation
-            has_active = room.reservations.filter(
-                status__in=["pending", "confirmed", "checked_in"]
-            ).exclude(pk=reservation.pk).exists()
-            if not has_active:
-                room.reserved = False
-                room.save(update_fields=["reserved"])
+        reservation_changed(reservation)
 
         # Return the full reservation payload
         return Response(RoomReservationSerializer(reservation).data, status=status.HTTP_200_OK)
@@ -383,24 +439,16 @@ class ReservationDetailView(generics.RetrieveUpdateDestroyAPIView):
         # Soft cancel
         instance.status = 'canceled'
         instance.save(update_fields=['status', 'updated_at'])
-
-        # If no other active reservations overlap today, free the room.reserved flag
-        room = instance.room
-        today = timezone.localdate()
-        still_occupied = RoomReservation.objects.filter(
-            room=room,
-            status__in=['pending', 'confirmed', 'checked_in'],
-            check_in__lte=today,
-            check_out__gt=today,
-        ).exists()
-
-        if room.reserved and not still_occupied:
-            room.reserved = False
-            room.save(update_fields=['reserved'])
+        reservation_changed(instance)
 
 # ============================================================================
 # CART VIEWS
 # ============================================================================
+def cart_items_for_display():
+    """Cart lines with product (and its categories) loaded for serialization"""
+    return CartItem.objects.select_related('product').prefetch_related('product__categories')
+
+
 class CartView(APIView):
     """Get cart for a given user_id"""
 
@@ -410,7 +458,11 @@ class CartView(APIView):
             return Response({"detail": "user_id is required"}, status=status.HTTP_400_BAD_REQUEST)
 
         customer = get_object_or_404(Customer, id=user_id)
-        cart, _ = Cart.objects.get_or_create(customer=customer)
+        cart, _ = (
+            Cart.objects
+            .prefetch_related(Prefetch('cart_items', queryset=cart_items_for_display()))
+            .get_or_create(customer=customer)
+        )
 
         serializer = CartSerializer(cart)
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -431,7 +483,7 @@ class CartItemListCreateView(APIView):
             return Response({"detail": "user_id is required"}, status=status.HTTP_400_BAD_REQUEST)
 
         cart = self._get_or_create_cart(user_id)
-        items = cart.cart_items.all()
+        items = cart_items_for_display().filter(cart=cart)
         serializer = CartItemSerializer(items, many=True)
         return Response(serializer.data)
 
@@ -456,16 +508,71 @@ class CartItemListCreateView(APIView):
             return Response({"detail": "Product not found or inactive."}, status=status.HTTP_404_NOT_FOUND)
 
         # Add or update cart item
-        cart_item, created = CartItem.objects.get_or_create(cart=cart, product=product)
-        if created:
-            cart_item.quantity = quantity
-        else:
-            cart_item.quantity += quantity
-        cart_item.save()
+        with transaction.atomic():
+            cart_item, created = CartItem.objects.get_or_create(cart=cart, product=product)
+            if created:
+                cart_item.quantity = quantity
+            else:
+                cart_item.quantity += quantity
+            cart_item.save()
+            cart.refresh_totals()
 
         serializer = CartItemSerializer(cart_item)
         return Response(serializer.data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
-    
+
+
+class BulkCartItemsView(APIView):
+    """Set or increment many cart lines in one transaction"""
+
+    def post(self, request):
+        serializer = BulkCartSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        mode = serializer.validated_data['mode']
+        lines = {line['product_id']: line['quantity'] for line in serializer.validated_data['items']}
+
+        customer = get_object_or_404(Customer, id=serializer.validated_data['user_id'])
+        cart, _ = Cart.objects.get_or_create(customer=customer)
+
+        active = set(Product.objects.filter(id__in=lines, is_active=True).values_list('id', flat=True))
+        missing = sorted(set(lines) - active)
+        if missing:
+            return Response(
+                {"detail": "Products not found or inactive.", "product_ids": missing},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        with transaction.atomic():
+            # Serializes concurrent writers on this cart so increments add up
+            Cart.objects.select_for_update().filter(pk=cart.pk).first()
+
+            if mode == 'increment':
+                current = dict(
+                    CartItem.objects.filter(cart=cart, product_id__in=lines)
+                    .values_list('product_id', 'quantity')
+                )
+                for product_id in lines:
+                    lines[product_id] += current.get(product_id, 0)
+
+            keep = {product_id: qty for product_id, qty in lines.items() if qty > 0}
+            CartItem.objects.bulk_create(
+                [CartItem(cart=cart, product_id=product_id, quantity=qty) for product_id, qty in keep.items()],
+                update_conflicts=True,
+                unique_fields=['cart', 'product'],
+                update_fields=['quantity', 'updated_at'],
+            )
+            if mode == 'replace':
+                CartItem.objects.filter(cart=cart).exclude(product_id__in=keep).delete()
+            else:
+                removed = [product_id for product_id, qty in lines.items() if qty == 0]
+                if removed:
+                    CartItem.objects.filter(cart=cart, product_id__in=removed).delete()
+            cart.refresh_totals()
+
+        cart = Cart.objects.prefetch_related(
+            Prefetch('cart_items', queryset=cart_items_for_display())
+        ).get(pk=cart.pk)
+        return Response(CartSerializer(cart).data, status=status.HTTP_200_OK)
+
     
 class CartItemDetailView(generics.RetrieveUpdateDestroyAPIView):
     """Update or delete cart item"""
@@ -473,14 +580,26 @@ class CartItemDetailView(generics.RetrieveUpdateDestroyAPIView):
     
     def get_queryset(self):
         cart = get_object_or_404(Cart, customer=self.request.user)
-        return CartItem.objects.filter(cart=cart)
+        return cart_items_for_display().filter(cart=cart)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        cart_item = serializer.save()
+        cart_item.cart.refresh_totals()
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        cart = instance.cart
+        instance.delete()
+        cart.refresh_totals()
 
 
 class ClearCartView(APIView):
     """Clear all items from cart"""
     def delete(self, request):
         cart = get_object_or_404(Cart, customer=request.user)
-        cart.cart_items.all().delete()
+        with transaction.atomic():
+            cart.clear()
         return Response({'message': 'Cart cleared successfully'})
 
 
@@ -488,6 +607,62 @@ class ClearCartView(APIView):
 # ORDER VIEWS
 # ============================================================================
 
+def decrement_stock(lines):
+    """
+    Take ``{product_id: quantity}`` out of stock in one conditional UPDATE.
+    Rows are locked in id order (so concurrent checkouts can't deadlock) and
+    the whole call fails with a ValidationError if any line is oversold or
+    inactive; nothing is clamped. Must run inside a transaction.
+    Returns the locked products keyed by id, with quantities already reduced.
+    """
+    products = {
+        p.id: p for p in Product.objects.select_for_update().filter(id__in=lines).order_by('id')
+    }
+    errors = {}
+    for product_id, quantity in lines.items():
+        product = products.get(product_id)
+        if product is None or not product.is_active:
+            errors[str(product_id)] = 'Product is no longer available.'
+        elif product.quantity < quantity:
+            errors[str(product_id)] = f'Only {product.quantity} left in stock for {product.name}.'
+    if errors:
+        raise ValidationError({'stock': errors})
+
+    # The per-row quantity guard keeps this safe even where row locks are a no-op (SQLite)
+    guard = Q()
+    for product_id, quantity in lines.items():
+        guard |= Q(id=product_id, quantity__gte=quantity)
+    updated = Product.objects.filter(guard).update(
+        quantity=F('quantity') - Case(
+            *(When(id=product_id, then=Value(quantity)) for product_id, quantity in lines.items()),
+            output_field=models.PositiveIntegerField(),
+        )
+    )
+    if updated != len(lines):
+        raise ValidationError({'stock': 'Stock changed during checkout, please try again.'})
+    # Bulk UPDATE sends no signals; the cached catalog shows stock levels
+    invalidate_catalog()
+
+    for product_id, quantity in lines.items():
+        products[product_id].quantity -= quantity
+    return products
+
+
+def orders_with_items(full_products=True):
+    """
+    Orders with customer and items loaded in a constant number of queries.
+    ``full_products`` also prefetches product categories for ProductSerializer.
+    """
+    items = OrderItem.objects.select_related('product').order_by('created_at')
+    if full_products:
+        items = items.prefetch_related('product__categories')
+    return (
+        Order.objects
+        .select_related('customer')
+        .prefetch_related(Prefetch('order_items', queryset=items))
+    )
+
+
 class OrderListCreateView(generics.ListCreateAPIView):
     serializer_class = OrderSerializer  # overridden for POST below
 
@@ -495,7 +670,7 @@ class OrderListCreateView(generics.ListCreateAPIView):
         user_id = self.request.query_params.get("user_id")
         if not user_id:
             return Order.objects.none()
-        return Order.objects.filter(customer_id=user_id)  # ✅
+        return orders_with_items().filter(customer_id=user_id)  # ✅
 
     def get_serializer_class(self):
         return CreateOrderSerializer if self.request.method == 'POST' else OrderSerializer
@@ -508,31 +683,23 @@ class OrderListCreateView(generics.ListCreateAPIView):
         cart = serializer.validated_data['cart']
         notes = serializer.validated_data.get('notes', '')
 
-        from django.db import transaction
         with transaction.atomic():
+            lines = {ci.product_id: ci.quantity for ci in cart.cart_items.all()}
+            products = decrement_stock(lines)
+
             order = Order.objects.create(
                 customer=customer,
-                total_amount=cart.total_amount,
+                total_amount=sum(products[pid].price * qty for pid, qty in lines.items()),
                 notes=notes,
             )
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=products[pid], quantity=qty, price=products[pid].price)
+                for pid, qty in lines.items()
+            ])
 
-            cart_items = cart.cart_items.select_related('product')
-            # create order items + decrement stock
-            from .models import OrderItem
-            bulk = []
-            for ci in cart_items:
-                bulk.append(OrderItem(
-                    order=order,
-                    product=ci.product,
-                    quantity=ci.quantity,
-                    price=ci.product.price,
-                ))
-                ci.product.quantity = max(0, ci.product.quantity - ci.quantity)
-                ci.product.save(update_fields=['quantity'])
-            OrderItem.objects.bulk_create(bulk)
-
-            cart_items.delete()
+            cart.clear()
 
+        order = orders_with_items().get(pk=order.pk)
         return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
 
 class OrderDetailView(generics.RetrieveAPIView):
@@ -561,14 +728,7 @@ class OrderDetailView(generics.RetrieveAPIView):
     serializer_class = OrderDetailSerializer
 
     def get_queryset(self):
-        base_qs = (
-            Order.objects
-            .select_related('customer')
-            .prefetch_related(
-                Prefetch('order_items', queryset=OrderItem.objects.select_related('product').order_by('created_at'))
-            )
-            .order_by('-created_at')
-        )
+        base_qs = orders_with_items().order_by('-created_at')
 
         user_id = self.request.query_params.get("user_id")
         if user_id:
@@ -583,25 +743,25 @@ class OrderDetailView(generics.RetrieveAPIView):
 
 
 class AllOrdersView(generics.ListAPIView):
-    """List all orders (Admin only)"""
-    serializer_class = OrderSerializer
+    """List all orders (Admin only); items carry a product summary, see OrderDetailView for full nesting"""
+    serializer_class = OrderListSerializer
     queryset = (
-        Order.objects
-        .prefetch_related('order_items')
+        orders_with_items(full_products=False)
         .order_by('-created_at')  # default order by newest
     )
 
-    # Optional: enable ?ordering=created_at or -created_at (and others)
-    from rest_framework.filters import OrderingFilter, SearchFilter
-    filter_backends = [OrderingFilter, SearchFilter]
-    ordering_fields = ['created_at', 'status']  # add fields you need
+    pagination_class = KeysetPagination
+    ordering = ('-created_at', '-id')  # default for OrderingFilter and the keyset cursor
+
+    # ?ordering=created_at / status (either direction); id is appended as the cursor tiebreaker
+    filter_backends = [KeysetOrderingFilter, SearchFilter]
+    ordering_fields = ['created_at', 'status']
+    # Substring matches, so an admin can find a customer by any part of a name
     search_fields = ['order_number', 'customer__username', 'customer__first_name', 'customer__last_name']
 
 
 
 
-from django.conf import settings
-from django.core.mail import send_mail
 from django.shortcuts import get_object_or_404
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -611,25 +771,33 @@ from .models import Order
 from .serializers import OrderSerializer
 
 
+def order_status_email(order_id, email, first_name, status_label):
+    first_name = (first_name or '').strip() or 'Customer'
+    return build_email(
+        subject='Your Order Status Updated',
+        body=(
+            f"Dear {first_name},\n\n"
+            f"Your order #{order_id} status has been updated to: {status_label}.\n\n"
+            "Thank you for choosing Guest Management System . We appreciate your trust and look forward to serving you.\n\n"
+            "Best regards,\n"
+            "The Guest Management System Team"
+        ),
+        recipient=email,
+    )
+
+
 class UpdateOrderStatusView(APIView):
     """Update order status (Admin only) and notify customer via email"""
 
     def patch(self, request, pk):
-        order = get_object_or_404(Order, pk=pk)
+        order = get_object_or_404(orders_with_items(), pk=pk)
         status_value = request.data.get('status')
 
         # Validate status
         if status_value not in dict(Order.STATUS_CHOICES):
             return Response({'error': 'Invalid status'}, status=http_status.HTTP_400_BAD_REQUEST)
 
-        # Update status
         order.status = status_value
-        order.save()
-
-        # Prepare email recipient (supports order.customer or order.user)
-        customer = getattr(order, 'customer', None) or getattr(order, 'user', None)
-        customer_email = getattr(customer, 'email', None)
-        customer_first_name = (getattr(customer, 'first_name', None) or '').strip() or 'Customer'
 
         # Use human-friendly status label if available
         try:
@@ -637,60 +805,144 @@ class UpdateOrderStatusView(APIView):
         except Exception:
             status_label = status_value.upper()
 
-        email_sent = False
-        email_error = None
+        # Prepare email recipient (supports order.customer or order.user)
+        customer = getattr(order, 'customer', None) or getattr(order, 'user', None)
+        customer_email = getattr(customer, 'email', None)
 
-        if customer_email:
-            try:
-                send_mail(
-                    subject='Your Order Status Updated',
-                    message=(
-                        f"Dear {customer_first_name},\n\n"
-                        f"Your order #{order.id} status has been updated to: {status_label}.\n\n"
-                        "Thank you for choosing Guest Management System . We appreciate your trust and look forward to serving you.\n\n"
-                        "Best regards,\n"
-                        "The Guest Management System Team"
-                    ),
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[customer_email],
-                    fail_silently=False,
-                )
-                email_sent = True
-            except Exception as e:
-                # Order status is already updated; surface email failure but keep 200
-                email_error = str(e)
+        # The email is queued with the status change and sent by send_outbox_emails
+        with transaction.atomic():
+            order.save()
+            if customer_email:
+                enqueue_emails([
+                    order_status_email(order.id, customer_email, getattr(customer, 'first_name', None), status_label)
+                ])
 
         serializer = OrderSerializer(order)
         payload = {
             'order': serializer.data,
             'message': f'Order status updated to {status_label}',
-            'email_sent': email_sent
+            'email_queued': bool(customer_email)
         }
-        if email_error:
-            payload['email_error'] = f'Failed to send email: {email_error}'
 
         return Response(payload, status=http_status.HTTP_200_OK)
 
 
+class BulkUpdateOrderStatusView(APIView):
+    """Change many order statuses at once (Admin only) and queue the customer emails"""
+    max_orders = 1000
+
+    def patch(self, request):
+        serializer = OrderStatusChangeSerializer(
+            data=request.data, many=True, allow_empty=False, max_length=self.max_orders
+        )
+        serializer.is_valid(raise_exception=True)
+        targets = {change['id']: change['status'] for change in serializer.validated_data}
+        labels = dict(Order.STATUS_CHOICES)
+
+        with transaction.atomic():
+            current = {
+                row['id']: row for row in
+                Order.objects.select_for_update()
+                .filter(id__in=targets)
+                .values('id', 'status', 'customer__email', 'customer__first_name')
+            }
+            missing = sorted(set(targets) - set(current))
+            if missing:
+                return Response(
+                    {'error': 'Orders not found', 'missing_ids': missing},
+                    status=http_status.HTTP_400_BAD_REQUEST,
+                )
+
+            # Orders already in the requested status are left alone
+            by_status = {}
+            for order_id, target in targets.items():
+                if current[order_id]['status'] != target:
+                    by_status.setdefault(target, []).append(order_id)
+
+            # Bulk UPDATE skips auto_now, so updated_at is set explicitly for the rollups
+            now = timezone.now()
+            for target, ids in by_status.items():
+                Order.objects.filter(id__in=ids).update(status=target, updated_at=now)
+
+            emails = [
+                order_status_email(
+                    order_id, current[order_id]['customer__email'],
+                    current[order_id]['customer__first_name'], labels[target],
+                )
+                for target, ids in by_status.items()
+                for order_id in ids
+                if current[order_id]['customer__email']
+            ]
+            enqueue_emails(emails)
+
+        updated = sorted(order_id for ids in by_status.values() for order_id in ids)
+        return Response({
+            'message': f'Updated {len(updated)} order(s)',
+            'updated_ids': updated,
+            'unchanged_ids': sorted(set(targets) - set(updated)),
+            'emails_queued': len(emails),
+        }, status=http_status.HTTP_200_OK)
+
+
 # ============================================================================
 # CHAT VIEWS
 # ============================================================================
 
 class ChatSessionListCreateView(generics.ListCreateAPIView):
     """List all chat sessions or create a new one"""
-    queryset = ChatBot.objects.all().order_by('-updated_at')
+    queryset = ChatBot.objects.select_related('last_message').order_by('-updated_at')
     serializer_class = ChatBotSerializer
 
 
 class ChatSessionDetailView(generics.RetrieveUpdateDestroyAPIView):
     """Retrieve, update, or delete a chat session"""
-    queryset = ChatBot.objects.all()
+    queryset = ChatBot.objects.select_related('last_message', 'customer')
     serializer_class = ChatBotDetailSerializer
 
 
-class ChatMessageListCreateView(generics.ListCreateAPIView):
+class MessageCursorMixin:
+    """
+    Incremental fetches for message lists.
+    With ?after_id=<id> or ?since=<ISO timestamp> only newer messages are
+    returned, wrapped as {"messages": [...], "last_id": ..., "last_timestamp": ...};
+    the client passes last_id back as after_id on its next poll.
+    Without either parameter the full list is returned as before.
+    """
+
+    def list(self, request, *args, **kwargs):
+        after_id = request.query_params.get('after_id')
+        since = request.query_params.get('since')
+        if after_id is None and since is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.get_queryset()
+        if after_id is not None:
+            try:
+                after_id = int(after_id)
+            except ValueError:
+                return Response({"detail": "after_id must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+            queryset = queryset.filter(id__gt=after_id).order_by('id')
+        if since is not None:
+            since_dt = parse_datetime(since)
+            if since_dt is None:
+                return Response({"detail": "since must be an ISO 8601 datetime"}, status=status.HTTP_400_BAD_REQUEST)
+            if timezone.is_naive(since_dt):
+                since_dt = timezone.make_aware(since_dt)
+            queryset = queryset.filter(timestamp__gt=since_dt)
+
+        messages = self.get_serializer(queryset, many=True).data
+        last = messages[-1] if messages else None
+        return Response({
+            'messages': messages,
+            'last_id': last['id'] if last else after_id,
+            'last_timestamp': last['timestamp'] if last else since,
+        })
+
+
+class ChatMessageListCreateView(MessageCursorMixin, generics.ListCreateAPIView):
     """List or create messages (filter by chat_session if ?chat_session=id)"""
     serializer_class = ChatMessageSerializer
+    pagination_class = ChronologicalKeysetPagination
 
     def get_queryset(self):
         chat_session = self.request.query_params.get("chat_session")
@@ -700,9 +952,10 @@ class ChatMessageListCreateView(generics.ListCreateAPIView):
         return qs
 
 
-class ChatSessionMessagesView(generics.ListAPIView):
+class ChatSessionMessagesView(MessageCursorMixin, generics.ListAPIView):
     """List all messages in a specific chat session"""
     serializer_class = ChatMessageSerializer
+    pagination_class = ChronologicalKeysetPagination
 
     def get_queryset(self):
         session_id = self.kwargs['pk']
@@ -727,6 +980,40 @@ class ChatSessionSendMessageView(APIView):
         serializer.is_valid(raise_exception=True)
         serializer.save()
         return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+def _last_event_id(request):
+    """Resume point sent by EventSource on reconnect (or ?after_id= on first connect)"""
+    value = request.headers.get('Last-Event-ID') or request.GET.get('after_id')
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+async def _open_chat_stream(request, session_id=None):
+    response = StreamingHttpResponse(
+        chat_event_stream(session_id, _last_event_id(request)),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def chat_session_stream(request, pk):
+    """
+    Server-Sent Events stream of new messages in one chat session.
+    Must be served through asgi.py (uvicorn/daphne); WSGI would buffer it.
+    """
+    if not await ChatBot.objects.filter(pk=pk).aexists():
+        return JsonResponse({"detail": "Chat session not found"}, status=status.HTTP_404_NOT_FOUND)
+    return await _open_chat_stream(request, pk)
+
+
+async def chat_sessions_stream(request):
+    """Server-Sent Events stream of new messages across all sessions (admin dashboard)"""
+    return await _open_chat_stream(request)
 # ============================================================================
 # FEEDBACK VIEWS
 # ============================================================================
@@ -738,6 +1025,7 @@ class FeedbackListCreateView(generics.ListCreateAPIView):
     """
     queryset = Feedback.objects.all().order_by('-id')
     serializer_class = FeedbackSerializer
+    pagination_class = IdKeysetPagination
     permission_classes = [permissions.AllowAny] 
 
 
@@ -777,43 +1065,111 @@ class AIInsightDetailView(generics.RetrieveAPIView):
 
 @api_view(['GET'])
 def dashboard_stats(request):
-    """Get dashboard statistics"""
-    stats = {
-        'total_customers': Customer.objects.count(),
-        'total_orders': Order.objects.count(),
-        'total_products': Product.objects.filter(is_active=True).count(),
-        'total_rooms': Room.objects.filter(is_active=True).count(),
-        'active_chat_sessions': ChatBot.objects.filter(session_status='A').count(),
-        'recent_feedback_count': Feedback.objects.filter(created_at__date=timezone.now().date()).count(),
-    }
-    return Response(stats)
+    """Get dashboard statistics (served from cache, see stats.py)"""
+    return Response(get_dashboard_stats())
+
+
+@api_view(['GET'])
+def revenue_analytics(request):
+    """Order revenue for ?start=&end= (end exclusive) by ?bucket=day|week|month and by category"""
+    start, end, error = _parse_date_range(request, 'start', 'end')
+    if error:
+        return error
+    bucket = request.GET.get('bucket', 'day')
+    if bucket not in BUCKETS:
+        return Response({"detail": f"bucket must be one of {', '.join(BUCKETS)}"}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(revenue_report(start, end, bucket))
+
+
+@api_view(['GET'])
+def occupancy_analytics(request):
+    """Occupancy, ADR and RevPAR per room category for the nights in ?start=&end="""
+    start, end, error = _parse_date_range(request, 'start', 'end')
+    if error:
+        return error
+    return Response(occupancy_report(start, end))
 
 
 from django.db import models
 
 @api_view(['GET'])
 def search_products(request):
-    """Search products by name or description"""
+    """Ranked search over product name, categories and description (?page= / ?page_size= to paginate)"""
     query = request.GET.get('q', '')
     if query:
-        products = Product.objects.filter(
-            models.Q(name__icontains=query) | 
-            models.Q(description__icontains=query),
-            is_active=True
-        )
-        serializer = ProductSerializer(products, many=True)
-        return Response(serializer.data)
+        def build():
+            ids = search_product_ids(query)
+            paginator = OptionalPageNumberPagination()
+            page = paginator.paginate_queryset(ids, request)
+            if page is not None:
+                ids = page
+            products = Product.objects.prefetch_related('categories').in_bulk(ids)
+            data = ProductSerializer(
+                [products[product_id] for product_id in ids if product_id in products],
+                many=True, context={'request': request},
+            ).data
+            return paginator.get_paginated_response(data).data if page is not None else data
+
+        return catalog_response(request, f'search:{request.GET.urlencode()}', build)
     return Response([])
 
 
+AUTOCOMPLETE_KINDS = ('product', 'room', 'customer')
+
+
+@api_view(['GET'])
+def autocomplete(request):
+    """Type-ahead: ?q= with optional ?kind=product|room|customer and ?limit= (per kind)"""
+    query = request.GET.get('q', '')
+    kind = request.GET.get('kind')
+    if kind and kind not in AUTOCOMPLETE_KINDS:
+        return Response(
+            {"detail": f"kind must be one of {', '.join(AUTOCOMPLETE_KINDS)}"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 50)
+    except ValueError:
+        return Response({"detail": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+    kinds = [kind] if kind else list(AUTOCOMPLETE_KINDS)
+    # Customer names are only offered to staff
+    if not getattr(request.user, 'is_staff', False):
+        kinds = [k for k in kinds if k != 'customer']
+    return Response(autocomplete_entries(query, kinds, limit))
+
+
+def _parse_date_range(request, start_param, end_param):
+    """Return (start, end, error_response) from two ISO date query params"""
+    start = parse_date(request.GET.get(start_param) or '')
+    end = parse_date(request.GET.get(end_param) or '')
+    if start is None or end is None:
+        return None, None, Response(
+            {"detail": f"{start_param} and {end_param} must be YYYY-MM-DD dates"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if start >= end:
+        return None, None, Response(
+            {"detail": f"{end_param} must be after {start_param}"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    return start, end, None
+
+
 @api_view(['GET'])
 def search_rooms(request):
-    """Search available rooms"""
+    """
+    Search available rooms.
+    With ?check_in=&check_out= availability is computed for those dates
+    (plus ?guests= for capacity); ?include_unavailable=true returns every
+    matching room with its ``available`` flag instead of only free ones.
+    Without dates the current ``reserved`` flag is used.
+    """
     category = request.GET.get('category', '')
     min_price = request.GET.get('min_price')
     max_price = request.GET.get('max_price')
     
-    rooms = Room.objects.filter(is_active=True, reserved=False)
+    rooms = Room.objects.filter(is_active=True)
     
     if category:
         rooms = rooms.filter(categories=category)
@@ -821,11 +1177,76 @@ def search_rooms(request):
         rooms = rooms.filter(price_per_night__gte=min_price)
     if max_price:
         rooms = rooms.filter(price_per_night__lte=max_price)
-    
-    serializer = RoomSerializer(rooms, many=True)
+
+    if 'check_in' not in request.GET and 'check_out' not in request.GET:
+        serializer = RoomSerializer(rooms.filter(reserved=False), many=True)
+        return Response(serializer.data)
+
+    check_in, check_out, error = _parse_date_range(request, 'check_in', 'check_out')
+    if error:
+        return error
+    try:
+        guests = int(request.GET.get('guests', 1))
+    except ValueError:
+        return Response({"detail": "guests must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+    rooms = annotate_availability(rooms.filter(capacity__gte=guests), check_in, check_out)
+    if request.GET.get('include_unavailable') != 'true':
+        rooms = rooms.filter(available=True)
+    serializer = RoomAvailabilitySerializer(rooms.order_by('price_per_night', 'room_code'), many=True)
     return Response(serializer.data)
 
 
+# Longest window the calendar endpoint will expand
+MAX_CALENDAR_NIGHTS = 366
+
+
+@api_view(['GET'])
+def room_availability_calendar(request):
+    """
+    Per-night availability matrix: ?start=&end= (end exclusive), optional
+    ?category= and ?guests=. Each room row lists one boolean per night,
+    True meaning the room is free that night.
+    """
+    start, end, error = _parse_date_range(request, 'start', 'end')
+    if error:
+        return error
+    if (end - start).days > MAX_CALENDAR_NIGHTS:
+        return Response(
+            {"detail": f"Calendar window is limited to {MAX_CALENDAR_NIGHTS} nights"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    try:
+        guests = int(request.GET.get('guests', 1))
+    except ValueError:
+        return Response({"detail": "guests must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+    rooms = Room.objects.filter(is_active=True, capacity__gte=guests).order_by('room_code')
+    category = request.GET.get('category')
+    if category:
+        rooms = rooms.filter(categories=category)
+    rooms = list(rooms)
+
+    free = availability_calendar(rooms, start, end)
+    return Response({
+        'start': start,
+        'end': end,
+        'dates': [start + timedelta(days=i) for i in range((end - start).days)],
+        'rooms': [
+            {
+                'id': room.id,
+                'room_code': room.room_code,
+                'categories': room.categories,
+                'capacity': room.capacity,
+                'price_per_night': str(room.price_per_night),
+                'free': free[room.id],
+                'free_nights': sum(free[room.id]),
+            }
+            for room in rooms
+        ],
+    })
+
+
 class PromotionListCreateView(generics.ListCreateAPIView):
     """
     GET: List promotions (search/order supported)